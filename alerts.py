@@ -0,0 +1,180 @@
+import datetime
+import time
+
+# 即時警報規則引擎：每台裝置 (safe_Mac) 一份狀態，讀數依 timestamp 順序餵進 process()，回傳觸發的事件。
+# 規則只看讀數上的時間，不看伺服器時鐘，所以線上 (LiveFeed) 和重播歷史資料 (benchmarks/replay_alerts.py)
+# 判斷結果相同。比目前進度早的讀數 (晚到、重複) 直接略過。
+# 每個規則有 cooldown_sec：同一台裝置同一規則觸發後這段時間內不再觸發 (去抖動)。
+
+FALL_STATE = "5"                        # postureText: '5' = 跌倒
+LYING_STATES = {"3", "4", "5", "6", "7"}  # 跌倒後還躺著不算起身
+BATTERY_FIELDS = ("safe_battery", "band_battery")
+
+DEFAULT_RULES = {
+    # 進入跌倒姿態
+    "fall": {"enabled": True, "cooldown_sec": 60},
+    # 跌倒後 seconds 秒內沒有起身，ACC_total 的變化也不超過 acc_delta (g)
+    "fall_no_motion": {"enabled": True, "seconds": 30, "acc_delta": 0.3, "cooldown_sec": 300},
+    # 心率低於 low 或高於 high 連續 sustain_sec 秒 (HR 為 0 或沒有值視為沒戴，不列入)
+    "hr": {"enabled": True, "low": 40, "high": 140, "sustain_sec": 10, "cooldown_sec": 300},
+    # 電量降到 threshold 以下；回到 rearm 以上才會再警報
+    "battery": {"enabled": True, "threshold": 15, "rearm": 20, "cooldown_sec": 3600},
+}
+SEVERITY = {"fall": "critical", "fall_no_motion": "critical", "hr": "warning", "battery": "info"}
+BATTERY_NAMES = {"safe_battery": "平安符", "band_battery": "手環"}
+
+_UTC = datetime.timezone.utc
+
+
+def merge_rules(overrides):
+    """DEFAULT_RULES 加上覆寫 ({規則: {參數: 值}})；不認得的規則、參數或型別錯誤丟 ValueError"""
+    rules = {name: dict(params) for name, params in DEFAULT_RULES.items()}
+    for name, params in (overrides or {}).items():
+        if name not in rules or not isinstance(params, dict):
+            raise ValueError(f"未知的規則: {name}")
+        for key, value in params.items():
+            if key not in rules[name]:
+                raise ValueError(f"{name} 沒有參數 {key}")
+            if key == "enabled":
+                if not isinstance(value, bool):
+                    raise ValueError(f"{name}.enabled 必須是 true / false")
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f"{name}.{key} 必須是非負數")
+            rules[name][key] = value
+    return rules
+
+
+def to_ms(ts):
+    """naive datetime 當作 UTC (pymongo 讀出來的就是)"""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=_UTC)
+    return ts.timestamp() * 1000
+
+
+def _number(v):
+    return v if isinstance(v, (int, float)) and not isinstance(v, bool) else None
+
+
+class DeviceState:
+    __slots__ = ("last_ms", "state", "fall_ms", "acc_min", "acc_max", "no_motion_fired",
+                 "hr_out_since", "battery_low", "fired")
+
+    def __init__(self):
+        self.last_ms = None
+        self.state = None
+        self.fall_ms = None           # 目前這次跌倒的開始時間；起身或有動作就清掉
+        self.acc_min = self.acc_max = None
+        self.no_motion_fired = False
+        self.hr_out_since = None
+        self.battery_low = set()
+        self.fired = {}               # 規則 (電量再分欄位) -> 上次觸發的毫秒
+
+
+class AlertEngine:
+    """不做 I/O；事件寫入與推播由呼叫端處理"""
+    def __init__(self, rules=None):
+        self.rules = merge_rules(rules)
+        self.devices = {}
+        self.processed = self.skipped = self.fired = self.suppressed = 0
+
+    def process(self, doc, received_ms=None):
+        """一筆讀數 → 觸發的事件 list；received_ms 是讀數到達 pipeline 的時間，用來算 pipelineMs"""
+        mac, ts = doc.get("safe_Mac"), doc.get("timestamp")
+        if not mac or not isinstance(ts, datetime.datetime):
+            self.skipped += 1
+            return []
+        t = to_ms(ts)
+        dev = self.devices.get(mac)
+        if dev is None:
+            dev = self.devices[mac] = DeviceState()
+        if dev.last_ms is not None and t <= dev.last_ms:
+            self.skipped += 1
+            return []
+        dev.last_ms = t
+        self.processed += 1
+
+        hits = self._evaluate(dev, doc, t)
+        events = []
+        for name, key, message, detail in hits:
+            last = dev.fired.get(key)
+            if last is not None and t - last < self.rules[name]["cooldown_sec"] * 1000:
+                self.suppressed += 1
+                continue
+            dev.fired[key] = t
+            events.append(self._event(doc, ts, t, name, message, detail, received_ms))
+        self.fired += len(events)
+        return events
+
+    def _evaluate(self, dev, doc, t):
+        """更新裝置狀態並回傳 [(規則, 去抖動 key, 訊息, 細節)]；停用的規則照樣追蹤狀態，重新啟用時才不會誤判"""
+        rules, hits = self.rules, []
+        state = doc.get("Posture_state")
+        state = str(state) if state is not None else dev.state
+        acc = _number(doc.get("ACC_total"))
+
+        # 跌倒 / 跌倒後沒有動作
+        if state == FALL_STATE and dev.state != FALL_STATE and dev.fall_ms is None:
+            dev.fall_ms, dev.acc_min, dev.acc_max, dev.no_motion_fired = t, acc, acc, False
+            if rules["fall"]["enabled"]:
+                hits.append(("fall", "fall", "偵測到跌倒", {"Posture_state": state}))
+        elif dev.fall_ms is not None:
+            if acc is not None:
+                dev.acc_min = acc if dev.acc_min is None else min(dev.acc_min, acc)
+                dev.acc_max = acc if dev.acc_max is None else max(dev.acc_max, acc)
+            moved = state not in LYING_STATES or (
+                dev.acc_min is not None and dev.acc_max - dev.acc_min > rules["fall_no_motion"]["acc_delta"])
+            if moved:
+                dev.fall_ms = None
+            elif not dev.no_motion_fired and t - dev.fall_ms >= rules["fall_no_motion"]["seconds"] * 1000:
+                dev.no_motion_fired = True
+                if rules["fall_no_motion"]["enabled"]:
+                    seconds = round((t - dev.fall_ms) / 1000)
+                    hits.append(("fall_no_motion", "fall_no_motion", f"跌倒後 {seconds} 秒沒有動作",
+                                 {"fallAt": datetime.datetime.fromtimestamp(dev.fall_ms / 1000, _UTC)
+                                  .replace(tzinfo=None), "seconds": seconds}))
+        dev.state = state
+
+        # 心率持續超出範圍
+        hr = _number(doc.get("HR"))
+        if hr:
+            rule = rules["hr"]
+            if hr < rule["low"] or hr > rule["high"]:
+                if dev.hr_out_since is None:
+                    dev.hr_out_since = t
+                if rule["enabled"] and t - dev.hr_out_since >= rule["sustain_sec"] * 1000:
+                    hits.append(("hr", "hr", f"心率 {hr:g} 超出 {rule['low']:g}–{rule['high']:g}",
+                                 {"HR": hr, "since": round((t - dev.hr_out_since) / 1000)}))
+            else:
+                dev.hr_out_since = None
+
+        # 電量過低 (兩個電池分開計算)
+        rule = rules["battery"]
+        for field in BATTERY_FIELDS:
+            level = _number(doc.get(field))
+            if level is None:
+                continue
+            if level <= rule["threshold"] and field not in dev.battery_low:
+                dev.battery_low.add(field)
+                if rule["enabled"]:
+                    hits.append(("battery", f"battery:{field}", f"{BATTERY_NAMES[field]}電量 {level:g}%",
+                                 {"field": field, "level": level}))
+            elif level >= rule["rearm"]:
+                dev.battery_low.discard(field)
+        return hits
+
+    def _event(self, doc, ts, t, name, message, detail, received_ms):
+        now = time.time() * 1000
+        event = {
+            "safe_Mac": doc["safe_Mac"], "rule": name, "severity": SEVERITY[name], "message": message,
+            "detail": detail, "timestamp": ts, "readingId": doc.get("_id"),
+            "detectedAt": datetime.datetime.fromtimestamp(now / 1000, _UTC).replace(tzinfo=None),
+            # 讀數時間 → 偵測 (含樹莓派上傳與 change stream 延遲)；重播歷史資料時沒有意義
+            "latencyMs": round(now - t, 1),
+        }
+        if received_ms is not None:
+            event["pipelineMs"] = round(now - received_ms, 3)   # 進到 pipeline → 產生事件
+        return event
+
+    def stats(self):
+        return {"devices": len(self.devices), "processed": self.processed, "skipped": self.skipped,
+                "fired": self.fired, "suppressed": self.suppressed}
@@ -0,0 +1,207 @@
+import datetime
+import gzip
+import heapq
+import json
+import os
+import tempfile
+from urllib.parse import quote, unquote
+
+from bson import ObjectId, json_util
+
+import wire_format
+
+# 超過保留期限的 raw posture_data 封存在本機磁碟：ARCHIVE_DIR/<db>/<YYYY-MM-DD>/<safe_Mac>.json.gz (UTC 日期)
+# 內容是 wire_format 的欄位化格式 (字串字典編碼、timestamp 差值編碼) 再 gzip，一天一台裝置一個檔。
+# 同一個檔重複寫入時依 _id 合併，所以封存中途當掉重跑不會遺失或重複資料。
+# 多台機器部署時 ARCHIVE_DIR 要指到共用的磁碟。
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+FORMAT_VERSION = 1
+GZIP_LEVEL = 6
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MS = datetime.timedelta(milliseconds=1)
+_PLAIN = (str, int, float, bool, type(None))
+
+
+def to_naive_utc(ts):
+    """pymongo 讀出來的 naive datetime 就是 UTC；帶時區的轉成 UTC 再去掉時區"""
+    if ts.tzinfo is not None:
+        return ts.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def day_of(ts):
+    return to_naive_utc(ts).strftime("%Y-%m-%d")
+
+
+def day_bounds(day):
+    """'YYYY-MM-DD' → (當天 00:00, 隔天 00:00)，naive UTC"""
+    start = datetime.datetime.strptime(day, "%Y-%m-%d")
+    return start, start + datetime.timedelta(days=1)
+
+
+def partition_path(db_name, day, mac, root=None):
+    return os.path.join(root or ARCHIVE_DIR, quote(db_name, safe=""), day, quote(str(mac), safe="") + ".json.gz")
+
+
+# ---- 編碼 ----
+def _column_type(values):
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, datetime.datetime) for v in present):
+        return "datetime"
+    if present and all(isinstance(v, ObjectId) for v in present):
+        return "objectid"
+    if present and all(isinstance(v, float) for v in present):
+        return "float"     # to_columnar 會把 1.0 存成 1，讀回時要轉回 float
+    return None
+
+
+def encode_rows(rows):
+    """list of dict → gzip 過的欄位化 JSON。datetime / ObjectId 欄位轉成毫秒 / hex 並記在 types，
+    其他非 JSON 型別 (Decimal128、巢狀裡的 datetime...) 用 bson 的 extended JSON 保存。
+    欄位化之後「沒有這個欄位」和「值是 null」都是 null，所以另外記下哪幾列沒有這個欄位；
+    int 與 float 混合的欄位裡，整數值的 float (70.0) 會被存成 70，也記下位置讀回時轉回 float"""
+    keys = list(dict.fromkeys(k for row in rows for k in row))
+    types = {k: t for k in keys if (t := _column_type([row.get(k) for row in rows]))}
+    missing = {k: idx for k in keys if (idx := [i for i, row in enumerate(rows) if k not in row])}
+    floats = {k: idx for k in keys if types.get(k) is None
+              and (idx := [i for i, row in enumerate(rows) if isinstance(row.get(k), float) and row[k].is_integer()])}
+    plain = []
+    for row in rows:
+        out = {}
+        for k, v in row.items():
+            t = types.get(k)
+            if v is None or t in (None, "float"):
+                out[k] = v if isinstance(v, _PLAIN) else json.loads(json_util.dumps(v))
+            elif t == "datetime":
+                out[k] = (to_naive_utc(v) - _EPOCH) // _MS
+            else:
+                out[k] = str(v)
+        plain.append(out)
+    payload = wire_format.to_columnar(plain)
+    payload["version"] = FORMAT_VERSION
+    payload["types"] = types
+    payload["missing"] = missing
+    payload["floats"] = floats
+    return gzip.compress(wire_format.dumps_json(payload), compresslevel=GZIP_LEVEL)
+
+
+def decode_rows(data):
+    payload = json.loads(gzip.decompress(data))
+    types = payload.get("types", {})
+    rows = wire_format.from_columnar(payload)
+    for k, idx in payload.get("missing", {}).items():
+        for i in idx:
+            del rows[i][k]
+    for k, idx in payload.get("floats", {}).items():
+        for i in idx:
+            rows[i][k] = float(rows[i][k])
+    for row in rows:
+        for k, v in row.items():
+            if v is None:
+                continue
+            t = types.get(k)
+            if t == "datetime":
+                row[k] = _EPOCH + int(v) * _MS
+            elif t == "objectid":
+                row[k] = ObjectId(v)
+            elif t == "float":
+                row[k] = float(v)
+            elif isinstance(v, (dict, list)):
+                row[k] = json_util.loads(json.dumps(v))
+    return rows
+
+
+def fingerprint(row):
+    """比對用的字串 (欄位排序過的 extended JSON)：值或型別 (70 / 70.0、1 / True) 不同就不一樣，
+    封存後讀回的資料要和原本的 raw 一致才能刪 raw"""
+    return json_util.dumps(row, sort_keys=True)
+
+
+# ---- 讀寫 ----
+def _sort_key(row):
+    ts = row.get("timestamp")
+    return (ts if isinstance(ts, datetime.datetime) else _EPOCH, str(row.get("_id")))
+
+
+def read_partition(db_name, day, mac, root=None):
+    """一天一台裝置的封存資料 (依 timestamp 排序)；沒有檔案回傳 []"""
+    try:
+        with open(partition_path(db_name, day, mac, root), "rb") as f:
+            return decode_rows(f.read())
+    except FileNotFoundError:
+        return []
+
+
+def write_partition(db_name, day, mac, rows, root=None):
+    """寫入 (與既有檔案依 _id 合併)，先寫暫存檔 fsync 再換名，不會留下寫一半的檔。回傳 (筆數, 檔案大小)"""
+    path = partition_path(db_name, day, mac, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    merged = {row["_id"]: row for row in read_partition(db_name, day, mac, root)}
+    merged.update((row["_id"], row) for row in rows)
+    data = encode_rows(sorted(merged.values(), key=_sort_key))
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return len(merged), len(data)
+
+
+def days(db_name, root=None):
+    """有封存資料的日期 (舊→新)"""
+    try:
+        return sorted(d for d in os.listdir(os.path.join(root or ARCHIVE_DIR, quote(db_name, safe="")))
+                      if len(d) == 10 and d[4] == "-")
+    except FileNotFoundError:
+        return []
+
+
+def macs_on(db_name, day, root=None):
+    try:
+        names = os.listdir(os.path.join(root or ARCHIVE_DIR, quote(db_name, safe=""), day))
+    except FileNotFoundError:
+        return []
+    return sorted(unquote(n[:-len(".json.gz")]) for n in names if n.endswith(".json.gz"))
+
+
+def iter_rows(db_name, mac=None, start=None, end=None, reverse=False, root=None):
+    """依 timestamp 順序產生 [start, end) 的封存資料；mac 為 None 時合併當天所有裝置。
+    一次只讀一天的檔案，reverse=True (新→舊) 時從最新一天開始讀，呼叫端拿夠了就不會再讀更舊的。
+    timestamp 不是 datetime 的列 (缺少或字串) 無法排序也不在任何時間範圍內，略過"""
+    start = to_naive_utc(start) if start is not None else None
+    end = to_naive_utc(end) if end is not None else None
+    selected = [d for d in days(db_name, root)
+                if (start is None or day_bounds(d)[1] > start) and (end is None or day_bounds(d)[0] < end)]
+    for day in (reversed(selected) if reverse else selected):
+        parts = [read_partition(db_name, day, m, root) for m in ([mac] if mac else macs_on(db_name, day, root))]
+        rows = parts[0] if len(parts) == 1 else list(heapq.merge(*parts, key=_sort_key))
+        if reverse:
+            rows.reverse()
+        for row in rows:
+            ts = row.get("timestamp")
+            if not isinstance(ts, datetime.datetime) \
+                    or (start is not None and ts < start) or (end is not None and ts >= end):
+                continue
+            yield row
+
+
+def summary(db_name, root=None):
+    """封存了幾天、幾個檔、多少 bytes"""
+    base = os.path.join(root or ARCHIVE_DIR, quote(db_name, safe=""))
+    all_days = days(db_name, root)
+    files = size = 0
+    for day in all_days:
+        for entry in os.scandir(os.path.join(base, day)):
+            if entry.name.endswith(".json.gz"):
+                files += 1
+                size += entry.stat().st_size
+    return {"days": len(all_days), "files": files, "bytes": size,
+            "first_day": all_days[0] if all_days else None, "last_day": all_days[-1] if all_days else None}
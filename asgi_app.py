@@ -0,0 +1,388 @@
+import asyncio
+import contextlib
+import datetime
+import heapq
+import itertools
+import os
+import time
+
+from a2wsgi import WSGIMiddleware               # pip install a2wsgi
+from itsdangerous import BadSignature
+from starlette.applications import Starlette    # pip install starlette uvicorn
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags
+
+import data_access
+import metrics
+import web_app
+import wire_format
+
+# ASGI 入口：最常被輪詢 (latest_data) 和最容易卡住 worker 的讀取 API (admin fan-out、10 萬筆 history_posechart)
+# 改用 AsyncMongoClient，等 Mongo 的時候不佔執行緒；其他路由 (頁面、登入、ETL、匯出、SSE...) 原封不動交給 Flask。
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 5050 --workers 4
+#   WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py asgi_app:app
+# 登入狀態直接讀 Flask 的 session cookie (同一個 secret_key)，權限判斷和 get_db_names() 一樣。
+# 客戶端中途斷線時取消正在跑的查詢 (cursor 會被關掉)，不會繼續替已經離開的瀏覽器查 Mongo。
+
+WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", "64"))   # 交給 Flask 的路由 (含 SSE 長連線) 用的執行緒
+OFFLOAD_ROWS = 1000          # 超過這麼多筆的合併 / 壓縮 / 序列化丟到執行緒，不要卡住 event loop
+CLIENT_CLOSED = 499          # nginx 的慣例：客戶端先斷線
+
+CANCELLED_REQUESTS = metrics.Counter("http_requests_cancelled_total",
+                                     "Async API requests cancelled because the client disconnected", ("route",))
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+# ----------------- session (與 Flask 共用 cookie) -----------------
+def load_session(request):
+    """解開 Flask 簽章的 session cookie；沒有、過期或簽章不對都回傳空的 dict"""
+    flask_app = web_app.app
+    cookie = request.cookies.get(flask_app.config["SESSION_COOKIE_NAME"])
+    if not cookie:
+        return {}
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        return serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+def save_session(response, sess):
+    """和 Flask 一樣每個 request 都重新簽發 permanent session，儀表板只打 async API 也不會閒置登出"""
+    flask_app = web_app.app
+    config = flask_app.config
+    if not sess.get("_permanent") or not config["SESSION_REFRESH_EACH_REQUEST"]:
+        return
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    response.set_cookie(
+        config["SESSION_COOKIE_NAME"], serializer.dumps(dict(sess)),
+        expires=datetime.datetime.now(datetime.timezone.utc) + flask_app.permanent_session_lifetime,
+        path=config["SESSION_COOKIE_PATH"] or config["APPLICATION_ROOT"] or "/",
+        domain=config["SESSION_COOKIE_DOMAIN"] or None,
+        secure=config["SESSION_COOKIE_SECURE"], httponly=config["SESSION_COOKIE_HTTPONLY"],
+        samesite=config["SESSION_COOKIE_SAMESITE"])
+
+async def db_names_for(sess):
+    """等同 web_app.get_db_names()"""
+    if not sess.get("logged_in"):
+        return []
+    db_name = sess.get("db_name")
+    if db_name == "*":
+        return await run_in_threadpool(web_app.list_tenant_dbs)   # 有快取，過期時才查一次 Mongo
+    return [db_name]
+
+def query_args(request):
+    """轉成 werkzeug MultiDict，web_app 的參數解析 (args.get(..., type=int)) 可以直接用"""
+    return MultiDict(request.query_params.multi_items())
+
+
+# ----------------- 併發查詢與取消 -----------------
+async def offload(n, fn, *args):
+    """資料量大 (n >= OFFLOAD_ROWS) 時在執行緒裡跑 fn"""
+    if n >= OFFLOAD_ROWS:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+async def fan_out(db_names, fn, timeout=web_app.FANOUT_TIMEOUT_SEC):
+    """web_app.fan_out 的 async 版：每個 DB 一個 coroutine，逾時的 DB 被取消並回報為 partial"""
+    if len(db_names) == 1:
+        return [await fn(db_names[0])], {}
+
+    outcomes = await asyncio.gather(*(asyncio.wait_for(fn(db_name), timeout) for db_name in db_names),
+                                    return_exceptions=True)
+    results, errors = [], {}
+    for db_name, outcome in zip(db_names, outcomes):
+        if isinstance(outcome, asyncio.TimeoutError):
+            errors[db_name] = "timeout"
+        elif isinstance(outcome, Exception):
+            errors[db_name] = str(outcome)
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            results.append(outcome)
+    if errors:
+        print(f"[WARN] fan-out 部分 DB 失敗: {errors}")
+    return results, errors
+
+async def find_all(cursor):
+    """讀完 cursor；被取消時也要關掉 cursor (送 killCursors)，server 端不會繼續準備下一批"""
+    try:
+        return await cursor.to_list()
+    finally:
+        await cursor.close()
+
+async def until_disconnect(request, coro):
+    """執行 coro，客戶端先斷線就取消它並丟出 ClientDisconnected。
+    已經丟到執行緒的工作 (壓縮、序列化) 無法中斷，會跑完才結束"""
+    work = asyncio.ensure_future(coro)
+
+    async def watch():
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not work.done():
+            work.cancel()
+            await asyncio.gather(work, return_exceptions=True)
+    if work.cancelled():
+        raise ClientDisconnected()
+    return work.result()
+
+
+# ----------------- 回應 -----------------
+def json_response(data, status=200, headers=None):
+    return Response(web_app.app.json.dumps(data) + "\n", status_code=status, headers=headers,
+                    media_type="application/json")
+
+def requested_format(request):
+    return wire_format.negotiate(request.headers.get("accept"), request.query_params.get("format"))
+
+async def api_response(request, data, errors=None):
+    """web_app.fanout_response 的 async 版"""
+    fmt = requested_format(request) if isinstance(data, list) else "json"
+    size = len(data) if isinstance(data, list) else len(data.get("items") or data.get("segments") or ())
+    body, mimetype = await offload(size, web_app.encode_api_body, data, fmt)
+    resp = Response(body, media_type=mimetype, headers={"Vary": "Accept"})
+    if errors:
+        resp.headers["X-Partial-Results"] = ",".join(sorted(errors))
+    return resp
+
+def degraded_response():
+    return json_response({"error": "資料庫暫時無法連線，請稍後再試", "degraded": True}, 503,
+                         {"Retry-After": str(data_access.breaker.retry_after())})
+
+async def compress_response(request, resp):
+    """同 web_app.compress_api_response"""
+    if resp.status_code != 200 or "content-encoding" in resp.headers:
+        return resp
+    resp.headers.add_vary_header("Accept-Encoding")
+    if len(resp.body) < web_app.COMPRESS_MIN_BYTES:
+        return resp
+    compressed, encoding = await offload(len(resp.body) // 100, wire_format.compress, resp.body,
+                                         request.headers.get("accept-encoding"))
+    if encoding is None:
+        return resp
+    resp.body = compressed
+    resp.headers["Content-Length"] = str(len(compressed))
+    resp.headers["Content-Encoding"] = encoding
+    etag = resp.headers.get("etag")
+    if etag:
+        # 不同編碼的內容不同，strong ETag 要分開
+        resp.headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+    return resp
+
+async def cached(request, db_names, compute, ttl=web_app.RESPONSE_CACHE_TTL_SEC):
+    """web_app.cached_response 的 async 版，和 Flask 共用同一個 response_cache (同樣的 key)"""
+    cache = web_app.response_cache
+    key, versions = web_app.response_cache_key(request.url.path, query_args(request), db_names,
+                                               requested_format(request))
+    stale = not data_access.breaker.allow()
+    # 資料庫斷線 (斷路器打開) 時不查 Mongo，回最後一次快取的結果
+    entry = cache.get_stale(key[:-1]) if stale else cache.get(key, versions)
+    if entry is None and stale:
+        return degraded_response()
+    if entry is None:
+        resp = await compute()
+        # 錯誤或部分 DB 失敗的結果不快取
+        if resp.status_code != 200 or "x-partial-results" in resp.headers:
+            if resp.status_code >= 500 and not data_access.breaker.allow():
+                entry = cache.get_stale(key[:-1])
+                if entry is not None:
+                    stale = True
+            if entry is None:
+                return resp
+        else:
+            headers = {h: resp.headers[h] for h in web_app.RESPONSE_CACHE_HEADERS + ("Content-Type", "Vary")
+                       if h in resp.headers}
+            entry = cache.put(key, versions, resp.body, headers, ttl)
+
+    _, _, etag, body, headers = entry
+    # 壓縮過的回應 ETag 會帶 -gzip / -br 後綴，也要認得
+    if_none_match = parse_etags(request.headers.get("if-none-match"))
+    matched = next((etag + suffix for suffix in ("", "-gzip", "-br") if if_none_match.contains(etag + suffix)),
+                   None)
+    if matched:
+        with cache.lock:
+            cache.not_modified += 1
+        resp = Response(status_code=304, headers={h: v for h, v in headers.items() if h != "Content-Type"})
+    else:
+        resp = Response(body, headers=headers)
+    resp.headers["ETag"] = f'"{matched or etag}"'
+    resp.headers["Cache-Control"] = "private, no-cache"   # 瀏覽器每次都帶 If-None-Match 回來確認
+    if stale:
+        resp.headers["X-Degraded"] = "stale"
+    return resp
+
+
+def api_route(handler, degraded_ok=False):
+    """包成 Starlette endpoint：讀 session、斷路器、客戶端斷線取消、壓縮、latency metric。
+    degraded_ok=False 的路由在斷路器打開時直接回 503 (同 web_app.guard_database_outage)"""
+    async def endpoint(request):
+        start = time.perf_counter()
+        sess = load_session(request)
+        try:
+            if not degraded_ok and not data_access.breaker.allow():
+                resp = degraded_response()
+            else:
+                resp = await until_disconnect(request, handler(request, sess))
+            resp = await compress_response(request, resp)
+        except ClientDisconnected:
+            CANCELLED_REQUESTS.inc(route=request.url.path)
+            resp = Response(status_code=CLIENT_CLOSED)
+        except Exception as e:
+            resp = json_response({"error": str(e)}, 500)
+        save_session(resp, sess)
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route=request.url.path,
+                                        method=request.method, status=resp.status_code,
+                                        db=sess.get("db_name") or "")
+        return resp
+    endpoint.__name__ = handler.__name__
+    return endpoint
+
+
+# ----------------- async API -----------------
+async def get_latest_data(request, sess):
+    db_names = await db_names_for(sess)
+    if not db_names:
+        return json_response([])
+    args = query_args(request)
+    mac, limit = web_app.latest_args(args)
+
+    async def from_cache(db_name):
+        # 記憶體 ring 命中時直接回傳；冷的裝置才在執行緒裡查 Mongo 載入
+        docs = web_app.latest_cache.peek(db_name, mac, limit)
+        if docs is None:
+            docs = await run_in_threadpool(web_app.latest_cache.get, db_name, mac, limit)
+        return docs
+
+    try:
+        results, errors = await fan_out(db_names, from_cache)
+    except Exception as e:
+        print(f"從 MongoDB 獲取數據失敗: {e}")
+        web_app.connect_to_mongodb_web()
+        return json_response({"error": "Failed to retrieve data", "details": str(e)}, 500)
+    return await api_response(request, web_app.merge_latest(results, limit, args.get("since", type=float)), errors)
+
+async def get_mac_list(request, sess):
+    db_names = await db_names_for(sess)
+    if not db_names:
+        return json_response([])
+
+    async def from_registry(db_name):
+        # 登錄表快取命中時直接回傳；過期才在執行緒裡讀 devices
+        docs = web_app.device_cache.peek(db_name)
+        if docs is None:
+            docs = await run_in_threadpool(web_app.device_cache.get, db_name)
+        return web_app.active_macs(docs)
+
+    results, errors = await fan_out(db_names, from_registry)
+    return await api_response(request, list({mac for result in results for mac in result}), errors)
+
+async def dashboard_snapshot(request, sess):
+    if not sess.get("logged_in"):
+        return json_response({"error": "未經授權，請先登入"}, 401)
+    try:
+        mac, rows, since_ms = web_app.dashboard_args(query_args(request))
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    db_names = await db_names_for(sess)
+    # 資料都在記憶體裡，只有冷的裝置、登錄表過期或段落快取過期才查 Mongo，整個丟到執行緒跑
+    snapshot, errors = await run_in_threadpool(web_app.build_dashboard_snapshot, db_names, mac, rows, since_ms)
+    headers = {"Cache-Control": "private, no-cache"}
+    if errors:
+        headers["X-Partial-Results"] = ",".join(sorted(errors))
+    if snapshot is None:
+        return json_response({"error": f"找不到裝置 {mac}"}, 404, headers)
+    headers["ETag"] = f'"{snapshot["version"]}"'
+    if web_app.etag_matches(parse_etags(request.headers.get("if-none-match")), snapshot["version"]):
+        return Response(status_code=304, headers=headers)
+    return json_response(snapshot, headers=headers)
+
+async def history_data(request, sess):
+    db_names = await db_names_for(sess)
+    if not db_names:
+        return json_response([])
+
+    try:
+        query, limit, projection, after = web_app.history_query(query_args(request))
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    async def compute():
+        async def query_db(db_name):
+            coll = data_access.async_collection(db_name, "posture_data")
+            docs = await find_all(coll.find(web_app.keyset_before(query, after, db_name), projection)
+                                  .sort(web_app.HISTORY_SORT).limit(limit + 1)
+                                  .max_time_ms(data_access.max_time_ms("interactive")))
+            if web_app.archive.days(db_name):
+                # 封存檔是磁碟 I/O + 解壓縮，在執行緒裡讀
+                docs = await run_in_threadpool(lambda: list(itertools.islice(
+                    web_app.with_archived(db_name, docs, query, after, projection), limit + 1)))
+            return db_name, docs
+
+        results, errors = await fan_out(db_names, query_db)
+        # 各 DB 已經依 (timestamp, _id) 新→舊排序，用 heap 合併
+        page = await offload(sum(len(docs) for _, docs in results), web_app.merge_history, results, limit)
+        data, next_cursor = web_app.history_page(page, limit, query)
+        resp = await api_response(request, data, errors)
+        if next_cursor:
+            resp.headers["X-Next-Cursor"] = next_cursor
+        return resp
+
+    return await cached(request, db_names, compute)
+
+async def history_posechart(request, sess):
+    db_names = await db_names_for(sess)
+    if not db_names:
+        return json_response([])
+    args = query_args(request)
+    query, limit, error = web_app.posechart_query(args)
+    if error:
+        return json_response({"error": error}, 400)
+
+    async def compute():
+        async def query_db(db_name):
+            docs = await find_all(data_access.async_collection(db_name, "posture_data")
+                                  .find(query, web_app.POSECHART_PROJECTION)
+                                  .sort("timestamp", -1).limit(limit)
+                                  .max_time_ms(data_access.max_time_ms("interactive")))
+            docs.reverse()   # 轉成舊→新
+            return docs
+
+        results, errors = await fan_out(db_names, query_db)
+        # 各 DB 已按時間排序，用 heap 合併後再壓縮
+        segments = await offload(sum(map(len, results)), lambda: web_app.compress_segments(
+            heapq.merge(*results, key=lambda x: x.get("timestamp", datetime.datetime.min))))
+        since_ms = args.get("since", type=float)
+        if since_ms is not None:
+            return await api_response(request, web_app.delta_response(segments, since_ms), errors)
+        return await api_response(request, segments, errors)
+
+    return await cached(request, db_names, compute)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    await data_access.close_async_client()
+
+ASYNC_ROUTES = [
+    Route("/api/latest_data", api_route(get_latest_data, degraded_ok=True)),
+    Route("/api/mac_list", api_route(get_mac_list)),
+    Route("/api/dashboard_snapshot", api_route(dashboard_snapshot)),
+    Route("/api/history_data", api_route(history_data, degraded_ok=True)),        # 斷線時由 cached 回舊資料
+    Route("/api/history_posechart", api_route(history_posechart, degraded_ok=True)),
+]
+
+app = Starlette(routes=ASYNC_ROUTES + [Mount("/", app=WSGIMiddleware(web_app.app, workers=WSGI_THREADS))],
+                lifespan=lifespan)
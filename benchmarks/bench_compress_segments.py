@@ -0,0 +1,109 @@
+"""compress_segments 效能比較：逐筆 (compress_segments_py) vs NumPy 欄位化 (compress_segments)
+
+用法:
+    python benchmarks/bench_compress_segments.py                 # 10k / 100k / 1M
+    python benchmarks/bench_compress_segments.py --rows 10000 --strings 0.5
+開始前先用 EDGE_CASES 在幾個本機時區下確認兩個版本輸出相同，不同就中止。
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from segments import compress_segments, compress_segments_py  # noqa: E402
+
+
+def make_docs(n, macs=3, string_ratio=0.0, seed=0):
+    """模擬樹莓派每秒一筆的 posture_data；string_ratio 比例的 timestamp 用 ISO 字串"""
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    docs = []
+    state = 0
+    for i in range(n):
+        if rng.random() < 0.02:
+            state = rng.randrange(5)
+        ts = start + datetime.timedelta(seconds=i)
+        docs.append({
+            "timestamp": ts.isoformat() if rng.random() < string_ratio else ts,
+            "Posture_state": state,
+            "safe_Mac": f"MAC{i * macs // n:02d}",
+        })
+    return docs
+
+
+# 容易走錯路徑的 timestamp 格式 (空白分隔 + 偏移、小寫 z、不帶秒的偏移) 與會被當成同值的 state
+EDGE_CASES = [
+    [{"timestamp": ts, "Posture_state": 1, "safe_Mac": "MAC00"}
+     for ts in ("2024-01-01 12:00:00+08:00", "2024-01-01 12:00:01", "2024-01-01T12:00:02z",
+                "2024-01-01T12:00:03Z", "2024-01-01T12:00:04-0500", "2024-01-01 12:00:05+08",
+                "2024-01-01T12:00:06.5+05:30", "2024-01-01")],
+    [{"timestamp": datetime.datetime(2024, 1, 1, 0, 0, i), "Posture_state": v, "safe_Mac": "MAC00"}
+     for i, v in enumerate([1, 1.0, True, "1", 1, None, "unknown"])],
+    [{"timestamp": "2024-03-10 01:59:59", "Posture_state": 0, "safe_Mac": "MAC00"},
+     {"timestamp": datetime.datetime(2024, 3, 10, 3, 0, 0), "Posture_state": 0, "safe_Mac": "MAC00"}],
+]
+CHECK_TIMEZONES = ("UTC", "Asia/Taipei", "America/New_York")
+
+
+def check_equivalence():
+    """EDGE_CASES 在各時區下 compress_segments 與 compress_segments_py 完全相同 (含 NumPy 不可有警告)"""
+    tz0 = os.environ.get("TZ")
+    try:
+        for tz in CHECK_TIMEZONES if hasattr(time, "tzset") else (tz0,):
+            if tz is not None:
+                os.environ["TZ"] = tz
+                time.tzset()
+            for docs in EDGE_CASES:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("error")
+                    try:
+                        got = compress_segments(docs)
+                    except Warning as w:
+                        return f"{tz}: {docs[0]['timestamp']!r}... 警告 {w}"
+                ref = compress_segments_py(docs)
+                if got != ref:
+                    return f"{tz}: {docs[0]['timestamp']!r}... 不同\n  numpy  {got}\n  python {ref}"
+    finally:
+        if hasattr(time, "tzset"):
+            if tz0 is None:
+                os.environ.pop("TZ", None)
+            else:
+                os.environ["TZ"] = tz0
+            time.tzset()
+    return None
+
+
+def bench(fn, docs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(docs)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="*", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--strings", type=float, default=0.0, help="ISO 字串 timestamp 的比例")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    mismatch = check_equivalence()
+    if mismatch:
+        sys.exit(f"compress_segments 與 compress_segments_py 輸出不同：{mismatch}")
+    print(f"{'rows':>10} {'python docs/s':>15} {'numpy docs/s':>15} {'speedup':>8} {'segments':>9} same")
+    for n in args.rows:
+        docs = make_docs(n, string_ratio=args.strings)
+        t_py, ref = bench(compress_segments_py, docs, args.repeat)
+        t_np, out = bench(compress_segments, docs, args.repeat)
+        print(f"{n:>10} {n / t_py:>15,.0f} {n / t_np:>15,.0f} {t_py / t_np:>7.1f}x {len(out):>9} {ref == out}")
+
+
+if __name__ == "__main__":
+    main()
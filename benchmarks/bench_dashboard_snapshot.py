@@ -0,0 +1,146 @@
+"""一個開著的儀表板每分鐘的傳輸量與 Mongo 工作量：各種輪詢方式 vs /api/dashboard_snapshot
+
+一台裝置每秒寫入一筆 (和樹莓派一樣直接寫進 posture_data)，每種方式模擬一個儀表板 --seconds 秒 (實際時間)：
+  polling   latest_data 每 1 秒 (不帶 mac，500 筆完整文件)、last_timestamp 每 3 秒、devices 每 15 秒
+  sse       latest_data?mac=&limit=10 一次、推播每筆完整文件、last_timestamp 每 3 秒、devices 每 15 秒
+  snapshot  dashboard_snapshot 第一次 rows=10，之後每 3 秒 rows=0 (帶 If-None-Match 與 since)、推播每筆完整文件
+            (目前的 index.html)
+bytes 是未壓縮的回應 body (推播以 sse_event 的大小計算)；Mongo 指令與回傳文件數從 metrics (CommandTimer) 讀，
+減掉只有寫入、沒有儀表板 (idle) 時的量，剩下的才是儀表板造成的。每種方式開始前清掉記憶體快取，包含第一次載入。
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_dashboard_snapshot.py
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_dashboard_snapshot.py --seconds 120 --out dash.json
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+os.environ.setdefault("ETL_SCHEDULER", "off")     # 排程的 ETL、登錄表 sweep 不要混進量測
+
+import datagen  # noqa: E402
+import metrics  # noqa: E402
+import web_app  # noqa: E402
+
+BENCH_DB = "bench_dashboard"
+MAC = "BD0000000001"
+HISTORY_SEC = 3600             # 先寫一小時的歷史資料並壓縮成段落
+
+SCENARIOS = {
+    "polling": [(1, "/api/latest_data"), (3, "/api/last_timestamp?mac={mac}"), (15, "/api/devices?mac={mac}")],
+    "sse": [(None, "/api/latest_data?mac={mac}&limit=10"), (3, "/api/last_timestamp?mac={mac}"),
+            (15, "/api/devices?mac={mac}")],
+    "snapshot": [(3, "/api/dashboard_snapshot?mac={mac}&rows={rows}")],
+}
+STREAMED = {"sse", "snapshot"}
+
+
+def mongo_work():
+    """(指令數, 回傳文件數)，只算 BENCH_DB"""
+    with metrics.MONGO_COMMAND_SECONDS.lock:
+        commands = sum(s[2] for k, s in metrics.MONGO_COMMAND_SECONDS.series.items() if k[0] == BENCH_DB)
+    with metrics.MONGO_DOCS_RETURNED.lock:
+        docs = sum(v for k, v in metrics.MONGO_DOCS_RETURNED.series.items() if k[0] == BENCH_DB)
+    return commands, docs
+
+
+def reset_caches():
+    with web_app.latest_cache.lock:
+        web_app.latest_cache.rings.clear()
+    web_app.device_cache.invalidate(BENCH_DB)
+    with web_app.dashboard_segments_lock:
+        web_app.dashboard_segments.clear()
+
+
+def run(name, http, readings, seconds):
+    reset_caches()
+    polls = SCENARIOS.get(name, [])
+    etag = since = None
+    out = {"requests": 0, "not_modified": 0, "bytes": 0, "stream_bytes": 0}
+    commands0, docs0 = mongo_work()
+    coll = web_app.mongo_client[BENCH_DB]["posture_data"]
+    t_start = time.monotonic()
+    for tick in range(seconds):
+        doc = next(readings)
+        doc["timestamp"] = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        coll.insert_one(doc)
+        if name in STREAMED:
+            out["stream_bytes"] += len(web_app.sse_event(doc).encode())
+        for period, url in polls:
+            if (period is None and tick == 0) or (period and tick % period == 0):
+                url = url.format(mac=MAC, rows=10 if etag is None else 0)
+                if url.startswith("/api/dashboard_snapshot") and since is not None:
+                    url += f"&since={since}"
+                resp = http.get(url, headers={"If-None-Match": etag} if etag else {})
+                body = resp.get_data()
+                out["requests"] += 1
+                out["bytes"] += len(body)
+                if resp.status_code == 304:
+                    out["not_modified"] += 1
+                elif url.startswith("/api/dashboard_snapshot") and resp.status_code == 200:
+                    etag, since = resp.headers.get("ETag"), resp.get_json()["last_ts"]
+        time.sleep(max(0.0, t_start + tick + 1 - time.monotonic()))
+    commands1, docs1 = mongo_work()
+    out.update(commands=commands1 - commands0, docs=docs1 - docs0)
+    return out
+
+
+def per_minute(result, seconds):
+    return {k: v * 60 / seconds for k, v in result.items()}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=int, default=60, help="每種方式跑幾秒")
+    ap.add_argument("--keep", action="store_true", help=f"保留 {BENCH_DB}")
+    ap.add_argument("--out", default=None, help="結果寫成 JSON")
+    args = ap.parse_args()
+    if not os.environ.get("MONGO_URI"):
+        sys.exit("請設定 MONGO_URI (例如 mongodb://localhost:27017)")
+
+    client = web_app.mongo_client
+    client.drop_database(BENCH_DB)
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+    readings = datagen.generate_device(MAC, now - datetime.timedelta(seconds=HISTORY_SEC), 10 ** 9)
+    client[BENCH_DB]["posture_data"].create_index([("safe_Mac", 1), ("timestamp", 1)])
+    client[BENCH_DB]["posture_data"].insert_many([next(readings) for _ in range(HISTORY_SEC)])
+    web_app.incremental_etl(BENCH_DB)
+    web_app.sweep_devices(BENCH_DB)
+    web_app.latest_cache.get(BENCH_DB, MAC, 1)     # 先開始 tail，idle 的量才包含 tail 本身
+
+    web_app.USERS["bench"] = {"password": "", "db": BENCH_DB}
+    http = web_app.app.test_client()
+    with http.session_transaction() as s:
+        s["logged_in"], s["username"], s["db_name"] = True, "bench", BENCH_DB
+
+    idle = run("idle", http, readings, args.seconds)
+    report = {"seconds": args.seconds, "idle": per_minute(idle, args.seconds), "per_minute": {}}
+    print(f"{'方式 (每分鐘)':<14}{'requests':>10}{'304':>6}{'回應 bytes':>12}{'推播 bytes':>12}{'合計 bytes':>12}"
+          f"{'Mongo 指令':>11}{'文件':>8}")
+    for name in SCENARIOS:
+        result = run(name, http, readings, args.seconds)
+        result["commands"] -= idle["commands"]
+        result["docs"] -= idle["docs"]
+        result = per_minute(result, args.seconds)
+        result["total_bytes"] = result["bytes"] + result["stream_bytes"]
+        report["per_minute"][name] = result
+        print(f"{name:<14}{result['requests']:>10.0f}{result['not_modified']:>6.0f}{result['bytes']:>12,.0f}"
+              f"{result['stream_bytes']:>12,.0f}{result['total_bytes']:>12,.0f}{result['commands']:>11.0f}"
+              f"{result['docs']:>8.0f}")
+
+    base = report["per_minute"]["polling"]
+    snap = report["per_minute"]["snapshot"]
+    if base["total_bytes"]:
+        print(f"snapshot / polling：bytes x{snap['total_bytes'] / base['total_bytes']:.3f}，"
+              f"requests x{snap['requests'] / base['requests']:.2f}")
+
+    if not args.keep:
+        client.drop_database(BENCH_DB)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果寫入 {args.out}")
@@ -0,0 +1,101 @@
+"""背景 full ETL 工作 (web_app.start_etl_job) 的回填速度：1 / 2 / 4 / 8 個 worker process 各跑一次，量 rows/s
+
+先用 datagen 產生 BENCH000... 的資料，每一輪開始前清掉這些 DB 的段落、rollup 與 watermark，從頭回填。
+baseline 是原本在 request 裡跑的單執行緒 incremental_etl (逐 DB、逐裝置)。
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_etl_scaling.py --dbs 2 --devices 8 --days 7
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_etl_scaling.py --workers 1,2,4,8 --out etl.json --keep
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+os.environ.setdefault("ETL_SCHEDULER", "off")     # 排程的 ETL 不要混進量測 (也不要搶 etl 鎖)
+
+import datagen  # noqa: E402
+import web_app  # noqa: E402
+
+POLL_SEC = 0.5
+
+
+def reset(db_names):
+    for db_name in db_names:
+        for name in ("posture_segments", "posture_rollups", "etl_watermarks"):
+            web_app.mongo_client[db_name][name].delete_many({})
+
+
+def run_baseline(db_names):
+    t0 = time.perf_counter()
+    rows = segments = 0
+    for db_name in db_names:
+        r, s = web_app.incremental_etl(db_name)
+        rows += r
+        segments += s
+    return {"rows": rows, "segments": segments, "seconds": time.perf_counter() - t0}
+
+
+def run_job(db_names, workers):
+    t0 = time.perf_counter()
+    job_id, active_id = web_app.start_etl_job(db_names, workers)
+    if job_id is None:
+        sys.exit(f"已經有 ETL 在執行 (工作 {active_id})，請稍後再試")
+    while True:
+        job = web_app.control_db["etl_jobs"].find_one({"_id": job_id})
+        if job["status"] not in web_app.ETL_JOB_ACTIVE:
+            break
+        time.sleep(POLL_SEC)
+    if job["status"] != "done":
+        sys.exit(f"工作 {job_id} {job['status']}: {job.get('error')}")
+    return {"rows": job["rows"], "segments": job["segments"], "tasks": job["progress"]["tasks"],
+            "seconds": time.perf_counter() - t0, "job": str(job_id)}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dbs", type=int, default=2)
+    ap.add_argument("--devices", type=int, default=8)
+    ap.add_argument("--days", type=float, default=7.0)
+    ap.add_argument("--workers", default="1,2,4,8")
+    ap.add_argument("--no-baseline", action="store_true", help="不跑單執行緒的 incremental_etl")
+    ap.add_argument("--keep", action="store_true", help="保留產生的 BENCH DB")
+    ap.add_argument("--out", default=None, help="結果寫成 JSON")
+    args = ap.parse_args()
+    if not os.environ.get("MONGO_URI"):
+        sys.exit("請設定 MONGO_URI (例如 mongodb://localhost:27017)")
+
+    db_names = datagen.db_names(args.dbs)
+    t0 = time.perf_counter()
+    counts = datagen.load(web_app.mongo_client, args.dbs, args.devices, args.days)
+    print(f"產生 {sum(counts.values())} 筆 ({args.dbs} DB x {args.devices} 台 x {args.days:g} 天)，"
+          f"{time.perf_counter() - t0:.1f} 秒")
+
+    report = {"dbs": args.dbs, "devices": args.devices, "days": args.days, "cpus": os.cpu_count(), "runs": {}}
+    if not args.no_baseline:
+        reset(db_names)
+        result = run_baseline(db_names)
+        result["rows_per_sec"] = result["rows"] / result["seconds"]
+        report["baseline"] = result
+        print(f"{'incremental_etl':<16}{result['rows']:>12} 筆 {result['seconds']:>8.1f} 秒"
+              f" {result['rows_per_sec']:>12,.0f} rows/s")
+
+    for workers in (int(w) for w in args.workers.split(",")):
+        reset(db_names)
+        result = run_job(db_names, workers)
+        result["rows_per_sec"] = result["rows"] / result["seconds"]
+        first = next(iter(report["runs"].values()), result)
+        result["speedup"] = result["rows_per_sec"] / first["rows_per_sec"] if first["rows_per_sec"] else None
+        report["runs"][workers] = result
+        print(f"{workers:>2} workers      {result['rows']:>12} 筆 {result['seconds']:>8.1f} 秒"
+              f" {result['rows_per_sec']:>12,.0f} rows/s  x{result['speedup']:.2f}  ({result['tasks']} 個任務)")
+
+    if not args.keep:
+        for db_name in db_names:
+            web_app.mongo_client.drop_database(db_name)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果寫入 {args.out}")
@@ -0,0 +1,96 @@
+"""匯出的記憶體用量：原本一次 find() 全部讀進 list 再 jsonify vs /api/export 串流 (keyset 分頁)
+
+需要一個可以寫入的 MongoDB (會建立並刪除 bench_export 這個 DB):
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_export_memory.py
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_export_memory.py --docs 1000000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import web_app  # noqa: E402
+
+BENCH_DB = "bench_export"
+
+
+def seed(coll, n, seed=0):
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    batch = []
+    for i in range(n):
+        batch.append({
+            "safe_Mac": "F7792BAEB511", "timestamp": start + datetime.timedelta(seconds=i),
+            "Posture_state": rng.randint(1, 8), "HR": rng.randint(55, 110),
+            "Blood_oxygen": rng.randint(93, 100), "Temperature": round(rng.uniform(35.5, 37.5), 1),
+            "ACC_X": rng.uniform(-1, 1), "ACC_Y": rng.uniform(-1, 1), "ACC_Z": rng.uniform(-1, 1),
+            "safe_battery": 80, "band_battery": 70,
+        })
+        if len(batch) == 10000:
+            coll.insert_many(batch)
+            batch = []
+    if batch:
+        coll.insert_many(batch)
+
+
+def materialised(coll):
+    """舊的 /api/all_data：全部讀進 list 再整包轉 JSON"""
+    data = []
+    for doc in coll.find():
+        doc["_id"] = str(doc["_id"])
+        doc["timestamp"] = (doc["timestamp"] + datetime.timedelta(hours=8)).isoformat()
+        data.append(doc)
+    return len(json.dumps(data))
+
+
+def streamed(client):
+    """/api/export：邊讀邊送，不保留已送出的部分"""
+    resp = client.get(f"/api/export?format={ARGS.format}", buffered=False)
+    size = 0
+    for chunk in resp.response:
+        size += len(chunk)
+    resp.close()
+    return size
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    size = fn(*args)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=200000)
+    ap.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    ap.add_argument("--keep", action="store_true", help="保留測試資料")
+    ARGS = ap.parse_args()
+
+    coll = web_app.mongo_client[BENCH_DB]["posture_data"]
+    if coll.estimated_document_count() != ARGS.docs:
+        coll.drop()
+        print(f"寫入 {ARGS.docs} 筆測試資料 ...")
+        seed(coll, ARGS.docs)
+
+    web_app.USERS["bench"] = {"password": "", "db": BENCH_DB}
+    client = web_app.app.test_client()
+    with client.session_transaction() as s:
+        s["logged_in"], s["username"], s["db_name"] = True, "bench", BENCH_DB
+
+    print(f"{'方式':<14}{'輸出大小':>14}{'時間':>10}{'峰值記憶體':>14}")
+    for name, fn, arg in (("list+json", materialised, coll), (f"export/{ARGS.format}", streamed, client)):
+        size, elapsed, peak = measure(fn, arg)
+        print(f"{name:<14}{size / 1e6:>12.1f}MB{elapsed:>9.2f}s{peak / 1e6:>12.1f}MB")
+
+    if not ARGS.keep:
+        web_app.mongo_client.drop_database(BENCH_DB)
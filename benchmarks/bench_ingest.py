@@ -0,0 +1,112 @@
+"""/api/ingest 吞吐量 (readings/s)：直接 insert_many vs /api/ingest (含 LiveSegmenter 的線上段落更新)
+
+需要一個可以寫入的 MongoDB (會建立並刪除 bench_ingest 這個 DB):
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_ingest.py
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_ingest.py --devices 20 --seconds 3600 --batch 60
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("ETL_SCHEDULER", "off")     # 排程的 ETL 不要混進量測
+
+import web_app  # noqa: E402
+
+BENCH_DB = "bench_ingest"
+BENCH_KEY = "bench-ingest-key"
+
+
+def make_requests(devices, seconds, batch, seed=0):
+    """模擬每台裝置每秒一筆，每 batch 秒送一次；回傳依時間交錯的 request body"""
+    rng = random.Random(seed)
+    start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=seconds)
+    states = {f"BENCH{d:07d}": 1 for d in range(devices)}
+    bodies = []
+    for t0 in range(0, seconds, batch):
+        for mac in states:
+            readings = []
+            for t in range(t0, min(t0 + batch, seconds)):
+                if rng.random() < 0.02:            # 平均 50 秒換一次姿態
+                    states[mac] = rng.randint(1, 8)
+                readings.append({
+                    "timestamp": (start + datetime.timedelta(seconds=t)).isoformat(),
+                    "Posture_state": states[mac], "HR": rng.randint(55, 110),
+                    "Blood_oxygen": rng.randint(93, 100), "ACC_X": rng.uniform(-1, 1),
+                    "ACC_Y": rng.uniform(-1, 1), "ACC_Z": rng.uniform(-1, 1),
+                    "safe_battery": 80, "band_battery": 70,
+                })
+            bodies.append({"safe_Mac": mac, "readings": readings})
+    return bodies
+
+
+def bench_direct(bodies):
+    """樹莓派現在的寫法：直接 insert_many，沒有段落"""
+    coll = web_app.mongo_client[BENCH_DB]["posture_data"]
+    t0 = time.perf_counter()
+    for body in bodies:
+        docs = [dict(r, safe_Mac=body["safe_Mac"], timestamp=web_app.normalize_timestamp(r["timestamp"]))
+                for r in body["readings"]]
+        coll.insert_many(docs, ordered=False)
+    return time.perf_counter() - t0
+
+
+def bench_ingest(bodies):
+    """POST /api/ingest；回傳 (全部回 202 的時間, 寫入與段落都完成的時間)"""
+    client = web_app.app.test_client()
+    headers = {"X-Ingest-Key": BENCH_KEY}
+    t0 = time.perf_counter()
+    for body in bodies:
+        while True:
+            resp = client.post("/api/ingest", json=body, headers=headers)
+            if resp.status_code != 503:
+                break
+            time.sleep(0.05)                       # 佇列滿了，和樹莓派一樣等一下重送
+        assert resp.status_code == 202, resp.get_data(as_text=True)
+    accepted = time.perf_counter() - t0
+    web_app.ingest_writer.flush()
+    # 段落由 LiveSegmenter 從 LiveFeed 收到讀數後寫入：等 LiveFeed 追上最後一筆，再把緩衝寫完
+    last = web_app.mongo_client[BENCH_DB]["posture_data"].find_one(sort=[("_id", -1)], projection={"_id": 1})
+    feed = web_app.get_live_feed(BENCH_DB)
+    while feed.last_id != last["_id"]:
+        time.sleep(0.01)
+    web_app.live_segmenter.flush()
+    return accepted, time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--devices", type=int, default=10)
+    ap.add_argument("--seconds", type=int, default=1800, help="每台裝置模擬幾秒的資料")
+    ap.add_argument("--batch", type=int, default=30, help="每個 request 帶幾秒的讀數")
+    ap.add_argument("--keep", action="store_true", help="保留測試資料")
+    args = ap.parse_args()
+
+    bodies = make_requests(args.devices, args.seconds, args.batch)
+    n = sum(len(b["readings"]) for b in bodies)
+    print(f"{args.devices} 台裝置 x {args.seconds} 秒 = {n} 筆，{len(bodies)} 個 request")
+
+    client = web_app.mongo_client
+    client.drop_database(BENCH_DB)
+    client[BENCH_DB]["posture_data"].create_index([("safe_Mac", 1), ("timestamp", 1)])
+    elapsed = bench_direct(bodies)
+    print(f"{'insert_many':<24}{n / elapsed:>12,.0f} readings/s")
+
+    client.drop_database(BENCH_DB)
+    client[BENCH_DB]["posture_data"].create_index([("safe_Mac", 1), ("timestamp", 1)])
+    web_app.ensure_segment_index(client[BENCH_DB]["posture_segments"])
+    web_app.INGEST_KEYS[BENCH_KEY] = BENCH_DB
+    web_app.SCHEDULER_MODE = "local"              # 只有這個 process：自己做線上段落 (不跑排程)
+    web_app.list_tenant_dbs(refresh=True)
+    web_app.live_segmenter.sync()
+    accepted, done = bench_ingest(bodies)
+    segments = client[BENCH_DB]["posture_segments"].count_documents({})
+    print(f"{'/api/ingest (202)':<24}{n / accepted:>12,.0f} readings/s")
+    print(f"{'/api/ingest (含段落)':<24}{n / done:>12,.0f} readings/s   段落 {segments}")
+    print(f"writer: {web_app.ingest_writer.stats()}  segmenter: {web_app.live_segmenter.stats()}")
+
+    if not args.keep:
+        client.drop_database(BENCH_DB)
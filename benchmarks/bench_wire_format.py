@@ -0,0 +1,82 @@
+"""傳輸格式比較：目前的 list-of-dict JSON vs 欄位化 JSON vs MessagePack，含 gzip / brotli 後大小
+
+用法:
+    python benchmarks/bench_wire_format.py
+    python benchmarks/bench_wire_format.py --segments 100000 --docs 10000
+"""
+import argparse
+import datetime
+import gzip
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import wire_format  # noqa: E402
+
+
+def make_segments(n, seed=0):
+    """history_posechart 回傳的段落"""
+    rng = random.Random(seed)
+    t = 1_700_000_000_000.0
+    out = []
+    for _ in range(n):
+        length = rng.randint(1, 600) * 1000.0
+        out.append({"state": str(rng.randint(1, 8)), "startTime": t, "endTime": t + length,
+                    "safe_Mac": rng.choice(["F7792BAEB511", "2CCF6754457F", "ABCD12345678"]),
+                    "duration": length / 1000.0})
+        t += length + 1000.0
+    return out
+
+
+def make_docs(n, seed=0):
+    """history_data 回傳的完整 posture_data 文件"""
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    return [{
+        "_id": f"{rng.getrandbits(96):024x}", "safe_Mac": "F7792BAEB511",
+        "timestamp": start + datetime.timedelta(seconds=i), "Posture_state": rng.randint(1, 8),
+        "HR": rng.randint(55, 110), "Blood_oxygen": rng.randint(93, 100),
+        "Bloodpressure_SBP": rng.randint(100, 140), "Bloodpressure_DBP": rng.randint(60, 90),
+        "Temperature": round(rng.uniform(35.5, 37.5), 1), "ACC_X": rng.uniform(-1, 1),
+        "ACC_Y": rng.uniform(-1, 1), "ACC_Z": rng.uniform(-1, 1), "ACC_total": rng.uniform(0.9, 1.2),
+        "MAG_total": rng.uniform(20, 60), "safe_battery": 80, "band_battery": 70,
+    } for i in range(n)]
+
+
+def as_json(rows):
+    """和 Flask jsonify 一樣：datetime 轉成字串"""
+    return wire_format.dumps_json([{k: (v.isoformat() if isinstance(v, datetime.datetime) else v)
+                                    for k, v in row.items()} for row in rows])
+
+
+def report(name, rows):
+    encoders = [("json (current)", as_json),
+                ("columnar json", lambda r: wire_format.dumps_json(wire_format.to_columnar(r)))]
+    if wire_format.msgpack is not None:
+        encoders.append(("msgpack", lambda r: wire_format.dumps_msgpack(wire_format.to_columnar(r))))
+
+    print(f"\n{name}: {len(rows)} 筆")
+    print(f"{'format':<16} {'bytes':>12} {'gzip':>10} {'brotli':>10} {'encode ms':>10}")
+    for label, fn in encoders:
+        t0 = time.perf_counter()
+        body = fn(rows)
+        ms = (time.perf_counter() - t0) * 1000
+        gz = len(gzip.compress(body, compresslevel=5))
+        br = f"{len(wire_format.brotli.compress(body, quality=4)):,}" if wire_format.brotli else "-"
+        print(f"{label:<16} {len(body):>12,} {gz:>10,} {br:>10} {ms:>10.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--segments", type=int, default=50_000)
+    ap.add_argument("--docs", type=int, default=10_000)
+    args = ap.parse_args()
+    report("segments (history_posechart)", make_segments(args.segments))
+    report("documents (history_data)", make_docs(args.docs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""合成的 posture_data：每台裝置每秒一筆，欄位和樹莓派寫入、儀表板讀取的一樣
+
+姿態用馬可夫鏈 (坐 / 站 / 躺 / 走路為主，偶爾跌倒)，HR / SpO2 / 血壓 / 體溫做隨機漫步，
+IMU 依姿態給重力方向加雜訊，電量慢慢下降，偶爾有一段離線 (沒有資料)。同一個 seed 產生相同資料。
+
+用法 (只產生並寫入資料):
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/datagen.py --dbs 2 --devices 5 --days 1
+"""
+import argparse
+import datetime
+import math
+import os
+import random
+import sys
+import time
+
+# 平均停留秒數與下一個姿態的權重 (postureText: 1 坐 2 站 3 躺 4 右躺 5 跌倒 6 趴 7 左躺 8 走路)
+POSTURES = {
+    1: (900, {2: 5, 3: 1, 8: 3}),
+    2: (240, {1: 5, 8: 5, 5: 0.05}),
+    3: (1800, {4: 3, 7: 3, 1: 2, 6: 1}),
+    4: (1200, {3: 3, 7: 1, 1: 1}),
+    5: (30, {3: 3, 1: 1}),
+    6: (600, {3: 2, 1: 1}),
+    7: (1200, {3: 3, 4: 1, 1: 1}),
+    8: (300, {2: 5, 1: 2, 5: 0.05}),
+}
+# 各姿態的重力方向 (ACC_X, ACC_Y, ACC_Z)，單位 g
+GRAVITY = {1: (0.2, 0.1, 0.97), 2: (0.0, 0.0, 1.0), 3: (0.0, 1.0, 0.0), 4: (1.0, 0.0, 0.0), 5: (0.6, 0.6, 0.4),
+           6: (0.0, -1.0, 0.0), 7: (-1.0, 0.0, 0.0), 8: (0.1, 0.0, 1.0)}
+OFFLINE_PER_DAY = 2             # 平均每天離線幾次
+OFFLINE_SEC = (60, 1800)        # 每次離線多久
+
+
+def device_macs(db_index, devices):
+    return [f"B{db_index:03d}{d:08X}" for d in range(devices)]
+
+
+def db_names(dbs, prefix="BENCH"):
+    return [f"{prefix}{i:03d}" for i in range(dbs)]
+
+
+def _next_state(rng, state):
+    choices, weights = zip(*POSTURES[state][1].items())
+    return rng.choices(choices, weights)[0]
+
+
+def generate_device(mac, start, seconds, seed=0):
+    """產生一台裝置 [start, start + seconds) 的每秒資料 (generator)；start 為 naive UTC"""
+    rng = random.Random(f"{mac}:{seed}")
+    state = rng.choice([1, 2, 3])
+    stay = rng.expovariate(1 / POSTURES[state][0])
+    hr, spo2, sbp, dbp, temp = 72.0, 97.0, 118.0, 76.0, 36.6
+    battery, band = rng.uniform(60, 100), rng.uniform(60, 100)
+    steps = mileage = calories = 0.0
+    yaw = rng.uniform(-180, 180)
+    offline_until = -1
+    for t in range(seconds):
+        if t < offline_until:
+            continue
+        if rng.random() < OFFLINE_PER_DAY / 86400:
+            offline_until = t + rng.randint(*OFFLINE_SEC)
+            continue
+
+        stay -= 1
+        if stay <= 0:
+            state = _next_state(rng, state)
+            stay = rng.expovariate(1 / POSTURES[state][0])
+
+        active = state in (2, 8)
+        hr += (90 if state == 8 else 75 if active else 65) * 0.02 - hr * 0.02 + rng.gauss(0, 0.8)
+        spo2 = min(100.0, max(90.0, spo2 + (97.5 - spo2) * 0.05 + rng.gauss(0, 0.2)))
+        sbp += (118 - sbp) * 0.01 + rng.gauss(0, 0.5)
+        dbp += (76 - dbp) * 0.01 + rng.gauss(0, 0.3)
+        temp += (36.6 - temp) * 0.001 + rng.gauss(0, 0.01)
+        battery = max(0.0, battery - 1 / 360)
+        band = max(0.0, band - 1 / 300)
+        if state == 8:
+            steps += 1.8
+            mileage += 1.2
+            calories += 0.08
+        if battery <= 0:
+            battery = 100.0      # 充電
+
+        gx, gy, gz = GRAVITY[state]
+        shake = 0.25 if state == 8 else 0.6 if state == 5 else 0.02
+        acc = [g + rng.gauss(0, shake) for g in (gx, gy, gz)]
+        mag = [rng.gauss(m, 2) for m in (22.0, -5.0, 40.0)]
+        yaw = (yaw + rng.gauss(0, 3 if active else 0.3) + 180) % 360 - 180
+        yield {
+            "safe_Mac": mac,
+            "timestamp": start + datetime.timedelta(seconds=t),
+            "Posture_state": state,
+            "HR": round(hr), "Blood_oxygen": round(spo2),
+            "Bloodpressure_SBP": round(sbp), "Bloodpressure_DBP": round(dbp),
+            "Temperature": round(temp, 1),
+            "ACC_X": round(acc[0], 3), "ACC_Y": round(acc[1], 3), "ACC_Z": round(acc[2], 3),
+            "ACC_total": round(math.sqrt(sum(a * a for a in acc)), 3),
+            "MAG_X": round(mag[0], 2), "MAG_Y": round(mag[1], 2), "MAG_Z": round(mag[2], 2),
+            "MAG_total": round(math.sqrt(sum(m * m for m in mag)), 2),
+            "roll16": round(math.degrees(math.atan2(acc[1], acc[2])), 1),
+            "pitch16": round(math.degrees(math.atan2(-acc[0], math.hypot(acc[1], acc[2]))), 1),
+            "yaw16": round(yaw, 1),
+            "Calories": round(calories, 1), "Step": int(steps), "Mileage": round(mileage, 1),
+            "safe_battery": int(battery), "band_battery": int(band),
+        }
+
+
+def load(client, dbs, devices, days, end=None, seed=0, batch_size=10000, drop=True):
+    """寫入 dbs 個 DB x devices 台裝置 x days 天的資料，回傳 {db 名稱: 筆數}；end 預設為現在"""
+    end = end or datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+    seconds = int(days * 86400)
+    start = end - datetime.timedelta(seconds=seconds)
+    counts = {}
+    for i, name in enumerate(db_names(dbs)):
+        if drop:
+            client.drop_database(name)
+        coll = client[name]["posture_data"]
+        coll.create_index([("safe_Mac", 1), ("timestamp", 1)])
+        n, batch = 0, []
+        for mac in device_macs(i, devices):
+            for doc in generate_device(mac, start, seconds, seed):
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    coll.insert_many(batch, ordered=False)
+                    n += len(batch)
+                    batch = []
+        if batch:
+            coll.insert_many(batch, ordered=False)
+            n += len(batch)
+        counts[name] = n
+    return counts
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dbs", type=int, default=1)
+    ap.add_argument("--devices", type=int, default=2)
+    ap.add_argument("--days", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    from pymongo import MongoClient
+    uri = os.environ.get("MONGO_URI")
+    if not uri:
+        sys.exit("請設定 MONGO_URI (例如 mongodb://localhost:27017)")
+    t0 = time.perf_counter()
+    counts = load(MongoClient(uri), args.dbs, args.devices, args.days, seed=args.seed)
+    elapsed = time.perf_counter() - t0
+    total = sum(counts.values())
+    print(f"寫入 {total} 筆 ({total / elapsed:,.0f} 筆/秒): {counts}")
@@ -0,0 +1,169 @@
+"""/api/latest_data 的延遲 (p50/p95/p99)：單獨輪詢 vs 同時有重的歷史查詢
+
+模擬儀表板每秒輪詢 latest_data 的使用者，另外開幾個 admin 連續打全部 DB 的 24 小時 history_posechart 等重查詢，
+比較兩個階段 latest_data 的延遲。對一個已經在跑的 server 量，WSGI 與 ASGI 各跑一次比較:
+    gunicorn -c gunicorn.conf.py web_app:app
+    python benchmarks/load_latency.py --url http://localhost:5050 --label wsgi --out wsgi.json
+
+    uvicorn asgi_app:app --port 5050 --workers 4
+    python benchmarks/load_latency.py --url http://localhost:5050 --label asgi --out asgi.json --compare wsgi.json
+
+server 上要有資料 (例如先跑 benchmarks/datagen.py)；重查詢每次帶不同的 _b 參數，不會命中回應快取。
+"""
+import argparse
+import http.cookiejar
+import json
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+HEAVY_QUERIES = [
+    "/api/history_posechart?hours=24&limit=100000",
+    "/api/all_history_posechart?hours=24",
+    "/api/history_data?hours=6&limit=10000",
+]
+
+
+def login(url, user, password):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    body = urllib.parse.urlencode({"username": user, "password": password}).encode()
+    with opener.open(f"{url}/login", body, timeout=30) as resp:
+        if not json.load(resp).get("success"):
+            sys.exit(f"{user} 登入失敗")
+    return next(c for c in jar if c.name == "session")
+
+
+def session_opener(cookie):
+    """每個執行緒自己的 opener (各自的 cookie jar，server 每次續簽 session 不會互相覆蓋)"""
+    jar = http.cookiejar.CookieJar()
+    jar.set_cookie(cookie)
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+
+
+def fetch(opener, url, timeout):
+    """回傳 (秒, HTTP status)；讀完整個 body 才算；連線錯誤 status 為 0"""
+    t0 = time.perf_counter()
+    try:
+        with opener.open(url, timeout=timeout) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = 0
+    return time.perf_counter() - t0, status
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(samples):
+    times = [t for t, status in samples if status == 200]
+    errors = sum(1 for _, status in samples if status != 200)
+    if not times:
+        return {"requests": len(samples), "errors": errors}
+    return {"requests": len(samples), "errors": errors,
+            "p50_ms": percentile(times, 0.50) * 1000, "p95_ms": percentile(times, 0.95) * 1000,
+            "p99_ms": percentile(times, 0.99) * 1000, "max_ms": max(times) * 1000,
+            "mean_ms": statistics.mean(times) * 1000}
+
+
+def poller(opener, url, interval, stop, samples, timeout):
+    """儀表板的行為：每 interval 秒一次；上一個太慢就馬上送下一個"""
+    next_at = time.perf_counter()
+    while not stop.is_set():
+        samples.append(fetch(opener, url, timeout))
+        next_at += interval
+        stop.wait(max(0.0, next_at - time.perf_counter()))
+
+
+def heavy(opener, base, queries, stop, samples, timeout):
+    i = 0
+    while not stop.is_set():
+        path = queries[i % len(queries)]
+        samples.append(fetch(opener, f"{base}{path}&_b={time.time_ns()}", timeout))
+        i += 1
+
+
+def run_phase(seconds, pollers, heavies):
+    """pollers / heavies: [(target, args)]；回傳各自的 samples"""
+    stop = threading.Event()
+    poll_samples, heavy_samples = [], []
+    threads = [threading.Thread(target=fn, args=args + (stop, poll_samples, timeout), daemon=True)
+               for fn, args, timeout in pollers]
+    threads += [threading.Thread(target=fn, args=args + (stop, heavy_samples, timeout), daemon=True)
+                for fn, args, timeout in heavies]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return poll_samples, heavy_samples
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://localhost:5050")
+    ap.add_argument("--label", default=None, help="寫進結果的名稱 (例如 wsgi / asgi)")
+    ap.add_argument("--pollers", type=int, default=20, help="同時在看儀表板的使用者數")
+    ap.add_argument("--interval", type=float, default=1.0, help="latest_data 輪詢間隔 (秒)")
+    ap.add_argument("--heavy", type=int, default=4, help="同時跑重查詢的 admin 數")
+    ap.add_argument("--seconds", type=float, default=60, help="每個階段跑多久")
+    ap.add_argument("--mac", default=None, help="latest_data 的 mac (預設不指定)")
+    ap.add_argument("--user", default="user", help="輪詢的帳號")
+    ap.add_argument("--password", default="0123")
+    ap.add_argument("--admin", default="admin", help="跑重查詢的帳號 (要能看全部 DB)")
+    ap.add_argument("--admin-password", default="0000")
+    ap.add_argument("--timeout", type=float, default=60)
+    ap.add_argument("--out", default=None)
+    ap.add_argument("--compare", default=None, help="之前的結果 JSON，印出 p99 比較")
+    args = ap.parse_args()
+
+    base = args.url.rstrip("/")
+    latest_url = f"{base}/api/latest_data?limit=10" + (f"&mac={urllib.parse.quote(args.mac)}" if args.mac else "")
+    user_cookie = login(base, args.user, args.password)
+    admin_cookie = login(base, args.admin, args.admin_password)
+    pollers = [(poller, (session_opener(user_cookie), latest_url, args.interval), args.timeout)
+               for _ in range(args.pollers)]
+    heavies = [(heavy, (session_opener(admin_cookie), base, HEAVY_QUERIES[i % len(HEAVY_QUERIES):]
+                        + HEAVY_QUERIES[:i % len(HEAVY_QUERIES)]), args.timeout)
+               for i in range(args.heavy)]
+
+    report = {"label": args.label, "url": base, "pollers": args.pollers, "interval": args.interval,
+              "heavy": args.heavy, "seconds": args.seconds}
+    print(f"只有輪詢: {args.pollers} 個使用者，{args.seconds:.0f} 秒")
+    poll, _ = run_phase(args.seconds, pollers, [])
+    report["latest_only"] = summarize(poll)
+    print(f"輪詢 + {args.heavy} 個重查詢: {args.seconds:.0f} 秒")
+    poll, slow = run_phase(args.seconds, pollers, heavies)
+    report["latest_under_load"] = summarize(poll)
+    report["heavy"] = summarize(slow)
+
+    for name in ("latest_only", "latest_under_load", "heavy"):
+        r = report[name]
+        if "p99_ms" in r:
+            print(f"  {name:<20}{r['requests']:>7} 次  p50 {r['p50_ms']:8.1f}  p95 {r['p95_ms']:8.1f}  "
+                  f"p99 {r['p99_ms']:8.1f}  max {r['max_ms']:8.1f} ms  錯誤 {r['errors']}")
+        else:
+            print(f"  {name:<20}{r['requests']:>7} 次  全部失敗")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果寫入 {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            old = json.load(f)
+        for name in ("latest_only", "latest_under_load"):
+            a, b = old.get(name, {}), report[name]
+            if "p99_ms" in a and "p99_ms" in b:
+                print(f"  {name} p99: {old.get('label') or args.compare} {a['p99_ms']:.1f} ms → "
+                      f"{args.label or '現在'} {b['p99_ms']:.1f} ms")
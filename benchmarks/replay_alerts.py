@@ -0,0 +1,122 @@
+"""把歷史 posture_data 全速餵進警報規則 (alerts.AlertEngine)，量 readings/s、事件數與延遲
+
+規則用 control DB 裡各 DB 的設定 (和線上相同)；每台裝置依 timestamp 順序重播 (走 safe_Mac + timestamp 索引)。
+--write 時事件寫進 alerts_replay (跑完刪掉，除非 --keep)，延遲包含寫入，等於線上 listener 的端到端時間。
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/replay_alerts.py --db 2CCF6754457F --hours 24
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/replay_alerts.py --write --out replay.json
+"""
+import argparse
+import collections
+import datetime
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("ETL_SCHEDULER", "off")     # 不要啟動排程和線上警報
+
+import alerts  # noqa: E402
+import web_app  # noqa: E402
+
+REPLAY_COLLECTION = "alerts_replay"
+FIELDS = {"_id": 1, "safe_Mac": 1, "timestamp": 1, "Posture_state": 1, "ACC_total": 1, "HR": 1,
+          "safe_battery": 1, "band_battery": 1}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))] if values else None
+
+
+def replay_db(db_name, start, mac=None, write=False):
+    """回傳 (讀數數, 事件 list, 每筆處理秒數 list, 每個事件的延遲毫秒 list, 讀資料秒數)"""
+    mongo_db = web_app.mongo_client[db_name]
+    engine = alerts.AlertEngine(web_app.alert_rules(db_name))
+    out = mongo_db[REPLAY_COLLECTION]
+    if write:
+        out.drop()
+        # 和 web_app.ensure_alert_indexes 建在 alerts 上的 unique index 一樣，寫入成本才相同
+        out.create_index([("safe_Mac", 1), ("rule", 1), ("timestamp", 1), ("detail.field", 1)], unique=True)
+
+    query = {"timestamp": {"$gte": start}} if start else {}
+    macs = [mac] if mac else sorted(mongo_db["posture_data"].distinct("safe_Mac", query))
+    rows, events, costs, latencies, read_sec = 0, [], [], [], 0.0
+    for m in macs:
+        cursor = mongo_db["posture_data"].find(dict(query, safe_Mac=m), FIELDS) \
+            .sort("timestamp", 1).batch_size(10000)
+        while True:
+            t_read = time.perf_counter()
+            doc = next(cursor, None)
+            read_sec += time.perf_counter() - t_read
+            if doc is None:
+                break
+            rows += 1
+            received_ms = time.time() * 1000
+            t0 = time.perf_counter()
+            fired = engine.process(doc, received_ms)
+            for event in fired:
+                if write:
+                    out.insert_one(event)
+                latencies.append(time.time() * 1000 - received_ms)
+            costs.append(time.perf_counter() - t0)
+            events.extend(fired)
+    return rows, events, costs, latencies, read_sec
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", action="append", help="要重播的 DB (可重複)；預設全部")
+    ap.add_argument("--mac", default=None)
+    ap.add_argument("--hours", type=float, default=None, help="只重播最近幾小時 (預設全部)")
+    ap.add_argument("--write", action="store_true", help=f"事件寫進 {REPLAY_COLLECTION}")
+    ap.add_argument("--keep", action="store_true", help=f"保留 {REPLAY_COLLECTION}")
+    ap.add_argument("--out", default=None, help="結果寫成 JSON")
+    args = ap.parse_args()
+
+    start = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=args.hours)
+             if args.hours else None)
+    db_names = args.db or web_app.list_tenant_dbs(refresh=True)
+    report = {"write": args.write, "dbs": {}}
+    total_rows, all_events, all_costs, all_latencies, total_read = 0, [], [], [], 0.0
+    t_start = time.perf_counter()
+    for db_name in db_names:
+        t0 = time.perf_counter()
+        rows, events, costs, latencies, read_sec = replay_db(db_name, start, args.mac, args.write)
+        elapsed = time.perf_counter() - t0
+        by_rule = collections.Counter(e["rule"] for e in events)
+        print(f"{db_name:<16}{rows:>10} 筆 {len(events):>7} 事件  {rows / elapsed if elapsed else 0:>10,.0f} readings/s"
+              f"  {dict(by_rule)}")
+        report["dbs"][db_name] = {"readings": rows, "events": len(events), "by_rule": dict(by_rule),
+                                  "seconds": elapsed}
+        total_rows += rows
+        all_events += events
+        all_costs += costs
+        all_latencies += latencies
+        total_read += read_sec
+        if args.write and not args.keep:
+            web_app.mongo_client[db_name][REPLAY_COLLECTION].drop()
+    elapsed = time.perf_counter() - t_start
+
+    engine_sec = sum(all_costs)
+    report.update({
+        "readings": total_rows, "events": len(all_events), "seconds": elapsed,
+        "readings_per_sec": total_rows / elapsed if elapsed else None,
+        "engine_readings_per_sec": total_rows / engine_sec if engine_sec else None,   # 不含讀 Mongo
+        "events_per_sec": len(all_events) / elapsed if elapsed else None,
+        "read_seconds": total_read,
+        "per_reading_us": {q: (percentile(all_costs, p) or 0) * 1e6 for q, p in (("p50", .5), ("p99", .99))},
+        "event_latency_ms": {q: percentile(all_latencies, p) for q, p in (("p50", .5), ("p95", .95), ("p99", .99))},
+    })
+    print(f"合計 {total_rows} 筆 / {len(all_events)} 事件，{elapsed:.1f} 秒 (讀 Mongo {total_read:.1f} 秒)")
+    print(f"  {report['readings_per_sec'] or 0:,.0f} readings/s，只算規則 {report['engine_readings_per_sec'] or 0:,.0f}"
+          f" readings/s，{report['events_per_sec'] or 0:,.1f} events/s")
+    print(f"  每筆規則 p50 {report['per_reading_us']['p50']:.1f} µs  p99 {report['per_reading_us']['p99']:.1f} µs")
+    if all_latencies:
+        lat = report["event_latency_ms"]
+        print(f"  事件延遲{'(含寫入)' if args.write else ''} p50 {lat['p50']:.3f}  p95 {lat['p95']:.3f}"
+              f"  p99 {lat['p99']:.3f} ms")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果寫入 {args.out}")
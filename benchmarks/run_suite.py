@@ -0,0 +1,231 @@
+"""效能測試套件：產生合成資料 → 量 API、compress_segments、full_etl / hourly_etl → 結果寫成 JSON
+
+每個 scale 會重建 BENCH000... 這些 DB (其他 DB 不動；但 full_etl / admin 查詢會掃所有 DB，
+所以 server 上有其他 DB 時預設拒絕執行)。
+
+用法:
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/run_suite.py --scales small,medium
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/run_suite.py --out after.json --baseline before.json
+    python benchmarks/run_suite.py --inprocess --scales small      # 不需要 mongod (pip install mongomock)
+
+--baseline 時，任何一項的 median 比 baseline 慢超過 --tolerance (且超過 --min-delta 秒) 就以 exit code 1 結束。
+in-process 模式只適合確認套件能跑：mongomock 不支援 change stream、$convert，
+部分版本的 bulk_write 也和新版 pymongo 不相容，這些項目會記錄成 error。
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+
+import datagen  # noqa: E402
+
+# (DB 數, 每個 DB 的裝置數, 天數)
+SCALES = {
+    "small": (1, 2, 0.25),
+    "medium": (2, 5, 1),
+    "large": (4, 10, 7),
+}
+COMPRESS_MAX_ROWS = 1_000_000     # compress_segments 最多量幾筆 (在記憶體中產生)
+
+# (名稱, URL)；{mac} 為第一台裝置，{start_1h} 為一小時前 (毫秒)
+ENDPOINTS = [
+    ("mac_list", "/api/mac_list"),
+    ("latest_data", "/api/latest_data?mac={mac}&limit=10"),
+    ("history_data_1h", "/api/history_data?mac={mac}&hours=1"),
+    ("history_posechart_6h", "/api/history_posechart?mac={mac}&hours=6"),
+    ("all_history_posechart_24h", "/api/all_history_posechart?hours=24"),
+    ("series_24h", "/api/series?mac={mac}&fields=HR,Blood_oxygen&hours=24"),
+    ("posture_summary_7d", "/api/posture_summary?mac={mac}&days=7"),
+    ("export_1h", "/api/export?mac={mac}&start={start_1h}"),
+]
+
+
+def import_app(inprocess):
+    """in-process 模式要在 import web_app 之前換掉 MongoClient (web_app import 時就會連線)"""
+    if inprocess:
+        import mongomock  # pip install mongomock
+        import pymongo
+        shared = mongomock.MongoClient()
+        pymongo.MongoClient = lambda *args, **kwargs: shared
+    elif not os.environ.get("MONGO_URI"):
+        sys.exit("請設定 MONGO_URI (例如 mongodb://localhost:27017) 或使用 --inprocess")
+    os.environ["ETL_SCHEDULER"] = "off"     # 不要讓排程的 ETL 混進量測
+    import web_app
+    return web_app
+
+
+def summarize(times, **extra):
+    times = sorted(times)
+    p95 = times[min(len(times) - 1, int(round(0.95 * (len(times) - 1))))]
+    return {"median_s": statistics.median(times), "p95_s": p95, "min_s": times[0], "max_s": times[-1],
+            "runs": len(times), **extra}
+
+
+def timed(fn, repeat=1):
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return times, result
+
+
+def guarded(name, fn):
+    """單一項目失敗時記錄錯誤，繼續跑下一項"""
+    try:
+        return fn()
+    except Exception as e:
+        print(f"  {name}: 失敗 {type(e).__name__}: {e}")
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+def run_scale(web_app, scale, dbs, devices, days, repeat, seed):
+    client = web_app.mongo_client
+    results = {}
+    end = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+    history_end = end - datetime.timedelta(hours=1)
+
+    # ---- 寫入：最後一小時先不寫，留給 hourly_etl ----
+    def load():
+        times, counts = timed(lambda: datagen.load(client, dbs, devices, days - 1 / 24, end=history_end, seed=seed))
+        rows = sum(counts.values())
+        return summarize(times, rows=rows, rows_per_s=rows / times[0])
+    results["load"] = guarded("load", load)
+    names = datagen.db_names(dbs)
+    web_app.list_tenant_dbs(refresh=True)
+
+    # ---- compress_segments (純計算，不含 Mongo) ----
+    def compress():
+        from segments import compress_segments, compress_segments_py
+        seconds = min(int(days * 86400), COMPRESS_MAX_ROWS // devices)
+        docs = [d for mac in datagen.device_macs(0, devices)
+                for d in datagen.generate_device(mac, history_end, seconds, seed)]
+        times, segs = timed(lambda: compress_segments(docs), repeat)
+        py_times, _ = timed(lambda: compress_segments_py(docs), max(1, repeat // 2))
+        return summarize(times, rows=len(docs), segments=len(segs), rows_per_s=len(docs) / statistics.median(times),
+                         py_median_s=statistics.median(py_times))
+    results["compress_segments"] = guarded("compress_segments", compress)
+
+    # ---- ETL：先全部壓縮，再補一小時跑 hourly ----
+    def full():
+        times, status = timed(web_app.full_etl)
+        return summarize(times, status=status)
+    results["full_etl"] = guarded("full_etl", full)
+
+    def hourly():
+        datagen.load(client, dbs, devices, 1 / 24, end=end, seed=seed + 1, drop=False)
+        times, _ = timed(web_app.hourly_etl)
+        return summarize(times)
+    results["hourly_etl"] = guarded("hourly_etl", hourly)
+
+    # ---- API (admin 看全部 DB)；每次加不同的 _b 參數，量的是沒有命中回應快取的時間 ----
+    http = web_app.app.test_client()
+    with http.session_transaction() as s:
+        s["logged_in"], s["username"], s["db_name"] = True, "admin", "*"
+    params = {"mac": datagen.device_macs(0, devices)[0],
+              "start_1h": int((time.time() - 3600) * 1000)}
+    for name, url in ENDPOINTS:
+        def request_endpoint(url=url.format(**params)):
+            times, statuses, sizes = [], set(), []
+            for i in range(repeat):
+                t0 = time.perf_counter()
+                resp = http.get(f"{url}{'&' if '?' in url else '?'}_b={time.time_ns()}")
+                body = resp.get_data()      # 串流回應要讀完才算
+                times.append(time.perf_counter() - t0)
+                statuses.add(resp.status_code)
+                sizes.append(len(body))
+            out = summarize(times, status=sorted(statuses), bytes=statistics.median(sizes))
+            if statuses != {200}:
+                out["error"] = f"HTTP {sorted(statuses)}"
+            return out
+        results[f"api:{name}"] = guarded(name, request_endpoint)
+
+    for name in names:
+        client.drop_database(name)
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """回傳變慢的項目 [(scale, 名稱, baseline 秒, 現在秒)]"""
+    regressions = []
+    for scale, items in results.items():
+        for name, cur in items.items():
+            old = baseline.get("results", {}).get(scale, {}).get(name)
+            if not old or "median_s" not in old or "median_s" not in cur:
+                continue
+            if cur["median_s"] > old["median_s"] * (1 + tolerance) and cur["median_s"] - old["median_s"] > min_delta:
+                regressions.append((scale, name, old["median_s"], cur["median_s"]))
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scales", default="small", help=f"逗號分隔：{','.join(SCALES)}，或 DBsxDEVICESxDAYS (例如 3x4x0.5)")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=None, help="結果 JSON (預設 benchmarks/results/<時間>.json)")
+    ap.add_argument("--baseline", default=None, help="和之前的結果比較，變慢就 exit 1")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="允許變慢的比例")
+    ap.add_argument("--min-delta", type=float, default=0.005, help="小於這個秒數的差異視為雜訊")
+    ap.add_argument("--inprocess", action="store_true", help="用 mongomock，不需要 mongod")
+    ap.add_argument("--allow-other-dbs", action="store_true", help="server 上有非 BENCH 的 DB 時仍然執行")
+    args = ap.parse_args()
+
+    web_app = import_app(args.inprocess)
+    # web_app import 時會在預設 DB 建 index，空的 DB 不算
+    others = [n for n in web_app.list_tenant_dbs(refresh=True)
+              if not n.startswith("BENCH") and web_app.mongo_client[n]["posture_data"].estimated_document_count()]
+    if others and not args.allow_other_dbs:
+        sys.exit(f"server 上有其他 DB ({', '.join(others)})，full_etl 與 admin 查詢會掃到它們；"
+                 f"請用獨立的 mongod 或加 --allow-other-dbs")
+
+    scales = {}
+    for s in args.scales.split(","):
+        scales[s] = SCALES[s] if s in SCALES else tuple(t(v) for t, v in zip((int, int, float), s.split("x")))
+
+    report = {"meta": {"commit": git_commit(), "python": platform.python_version(),
+                       "platform": platform.platform(), "inprocess": args.inprocess,
+                       "started": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                       "repeat": args.repeat, "seed": args.seed,
+                       "scales": {k: dict(zip(("dbs", "devices", "days"), v)) for k, v in scales.items()}},
+              "results": {}}
+    for scale, (dbs, devices, days) in scales.items():
+        print(f"== {scale}: {dbs} DB x {devices} 台 x {days} 天")
+        results = run_scale(web_app, scale, dbs, devices, days, args.repeat, args.seed)
+        report["results"][scale] = results
+        for name, r in results.items():
+            if "median_s" in r:
+                print(f"  {name:<32}{r['median_s'] * 1000:>10.1f} ms  (p95 {r['p95_s'] * 1000:.1f} ms)")
+
+    out = args.out or os.path.join(BENCH_DIR, "results",
+                                   datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果寫入 {out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report["results"], json.load(f), args.tolerance, args.min_delta)
+        for scale, name, old, cur in regressions:
+            print(f"  變慢 {scale}/{name}: {old * 1000:.1f} ms → {cur * 1000:.1f} ms")
+        if regressions:
+            sys.exit(1)
+        print("沒有超過容許範圍的變慢")
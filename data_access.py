@@ -0,0 +1,279 @@
+import threading
+import time
+
+import pymongo
+from pymongo import MongoClient, ReadPreference, monitoring
+from pymongo.errors import PyMongoError
+
+import metrics
+
+# 共用的 MongoDB 連線：整個 process 只有一個 MongoClient (一個連線池)，
+# 斷線由 driver 自己重連；背景探測 + 斷路器避免 Atlas 短暫斷線時每個 request 一起重連。
+
+POOL_MAX_SIZE = 50                   # 每台 server 最多幾條連線 (fan-out 16 + SSE/ETL/ingest)
+POOL_MIN_SIZE = 2
+POOL_MAX_IDLE_MS = 60 * 1000         # 閒置超過就關掉
+POOL_WAIT_QUEUE_TIMEOUT_MS = 2000    # 連線池滿時最多等多久，超過就失敗，不要讓 request 排隊
+SERVER_SELECTION_TIMEOUT_MS = 5000
+CONNECT_TIMEOUT_MS = 5000
+
+HEALTH_INTERVAL_SEC = 5              # 背景 ping 的間隔
+HEALTH_TIMEOUT_SEC = 2
+BREAKER_FAILURES = 3                 # 連續幾次連線失敗就斷路
+BREAKER_COOLDOWN_SEC = 10            # 斷路後至少多久才由探測決定是否恢復
+
+# 各類查詢的預設：讀哪個節點、最多跑多久
+QUERY_CLASSES = {
+    "interactive": {"read_preference": ReadPreference.PRIMARY_PREFERRED, "max_time_ms": 5000},    # 儀表板
+    "analytics": {"read_preference": ReadPreference.SECONDARY_PREFERRED, "max_time_ms": 60000},  # 匯出、長時間序列
+    "etl": {"read_preference": ReadPreference.PRIMARY, "max_time_ms": None},                     # 壓縮 / rollup
+}
+
+POOL_CHECKOUT_SECONDS = metrics.Histogram("mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+                                          buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0))
+POOL_CHECKOUT_FAILURES = metrics.Counter("mongo_pool_checkout_failures_total", "Failed connection checkouts",
+                                         ("reason",))
+POOL_CLEARED = metrics.Counter("mongo_pool_cleared_total", "Connection pools cleared after a network error")
+HEALTH_PING_SECONDS = metrics.Histogram("mongo_health_ping_seconds", "Background health probe ping latency")
+BREAKER_OPENS = metrics.Counter("mongo_circuit_opens_total", "Times the MongoDB circuit breaker opened")
+
+
+class CircuitBreaker:
+    """closed：正常；open：最近連續失敗，request 直接走快取 / 降級回應，只有背景探測會碰 Mongo。
+    open 超過 cooldown 且探測成功才回到 closed (探測就是 half-open 的那一次試探)。"""
+    def __init__(self, threshold=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN_SEC):
+        self.threshold, self.cooldown = threshold, cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        return self.state != "open"
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            if self.state == "open" and time.time() - self.opened_at >= self.cooldown:
+                self.state = "closed"
+                print(f"[DB] 連線恢復，斷路器關閉 (斷了 {time.time() - self.opened_at:.0f} 秒)")
+
+    def record_failure(self, reason):
+        with self.lock:
+            self.failures += 1
+            self.last_error = str(reason)
+            if self.state == "open":
+                self.opened_at = time.time()     # 還在失敗，延後恢復
+            elif self.failures >= self.threshold:
+                self.state = "open"
+                self.opened_at = time.time()
+                BREAKER_OPENS.inc()
+                print(f"[DB] 連續 {self.failures} 次連線失敗，斷路器打開: {reason}")
+
+    def retry_after(self):
+        if self.state != "open":
+            return 0
+        return max(1, int(self.cooldown - (time.time() - self.opened_at)) + 1)
+
+    def stats(self):
+        with self.lock:
+            return {"state": self.state, "failures": self.failures, "last_error": self.last_error,
+                    "opened_at": self.opened_at}
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """各 server 的連線數 / 借出數；借不到連線、連線池被清空都算一次連線失敗"""
+    def __init__(self, breaker):
+        self.breaker = breaker
+        self.pools = {}     # address -> {"open": 連線數, "checked_out": 借出數}
+        self.lock = threading.Lock()
+
+    def _pool(self, address):
+        return self.pools.setdefault(f"{address[0]}:{address[1]}", {"open": 0, "checked_out": 0})
+
+    def _add(self, event, key, delta):
+        with self.lock:
+            pool = self._pool(event.address)
+            pool[key] = max(0, pool[key] + delta)
+
+    def pool_created(self, event):
+        with self.lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        POOL_CLEARED.inc()
+        self.breaker.record_failure(f"pool cleared {event.address[0]}")
+
+    def pool_closed(self, event):
+        with self.lock:
+            self.pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        self._add(event, "open", 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(event, "open", -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        POOL_CHECKOUT_FAILURES.inc(reason=event.reason)
+        if event.reason in (monitoring.ConnectionCheckOutFailedReason.CONN_ERROR,
+                            monitoring.ConnectionCheckOutFailedReason.TIMEOUT):
+            self.breaker.record_failure(f"checkout {event.reason}")
+
+    def connection_checked_out(self, event):
+        self._add(event, "checked_out", 1)
+        duration = getattr(event, "duration", None)     # pymongo 4.7+ 才有
+        if duration is not None:
+            POOL_CHECKOUT_SECONDS.observe(duration)
+
+    def connection_checked_in(self, event):
+        self._add(event, "checked_out", -1)
+
+    def stats(self):
+        with self.lock:
+            return {address: dict(pool, max=POOL_MAX_SIZE) for address, pool in self.pools.items()}
+
+
+class HealthProbe:
+    """背景每 HEALTH_INTERVAL_SEC 秒 ping 一次，結果交給斷路器；wake() 可以要求提早檢查"""
+    def __init__(self, breaker):
+        self.breaker = breaker
+        self.client = None
+        self.last_ok = self.last_latency = None
+        self.event = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self, client):
+        with self.lock:
+            self.client = client
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True, name="mongo-health")
+                self.thread.start()
+
+    def wake(self):
+        self.event.set()
+
+    def check(self):
+        t0 = time.perf_counter()
+        try:
+            with pymongo.timeout(HEALTH_TIMEOUT_SEC):
+                self.client.admin.command("ping")
+        except PyMongoError as e:
+            self.breaker.record_failure(e)
+            return False
+        self.last_latency = time.perf_counter() - t0
+        self.last_ok = time.time()
+        HEALTH_PING_SECONDS.observe(self.last_latency)
+        self.breaker.record_success()
+        return True
+
+    def _run(self):
+        while True:
+            self.check()
+            self.event.wait(HEALTH_INTERVAL_SEC)
+            self.event.clear()
+            time.sleep(1)     # wake() 很頻繁時最多每秒一次
+
+    def stats(self):
+        return {"last_ok": self.last_ok, "last_latency_ms": None if self.last_latency is None
+                else round(self.last_latency * 1000, 1)}
+
+
+breaker = CircuitBreaker()
+pool_monitor = PoolMonitor(breaker)
+async_pool_monitor = PoolMonitor(breaker)     # asgi_app.py 的 AsyncMongoClient 另外一個連線池
+health = HealthProbe(breaker)
+_client = None
+_client_lock = threading.Lock()
+_async_client = None
+_uri = None
+
+metrics.GaugeFunc("mongo_pool_connections", "Pooled MongoDB connections", ("address", "state"),
+                  lambda: {(address, key): pool[key] for address, pool in pool_monitor.stats().items()
+                           for key in ("open", "checked_out")})
+metrics.GaugeFunc("mongo_pool_utilization", "Checked-out connections / maxPoolSize", ("address",),
+                  lambda: {(address,): pool["checked_out"] / POOL_MAX_SIZE
+                           for address, pool in pool_monitor.stats().items()})
+metrics.GaugeFunc("mongo_circuit_open", "1 while the MongoDB circuit breaker is open", (),
+                  lambda: {(): int(not breaker.allow())})
+
+
+def _client_options(monitor):
+    return dict(maxPoolSize=POOL_MAX_SIZE, minPoolSize=POOL_MIN_SIZE, maxIdleTimeMS=POOL_MAX_IDLE_MS,
+                waitQueueTimeoutMS=POOL_WAIT_QUEUE_TIMEOUT_MS,
+                serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS, connectTimeoutMS=CONNECT_TIMEOUT_MS,
+                retryReads=True, retryWrites=True,
+                event_listeners=[metrics.command_timer, monitor])
+
+
+def get_client(uri=None):
+    """第一次呼叫時用 uri 建立共用的 MongoClient，之後都回傳同一個"""
+    global _client, _uri
+    with _client_lock:
+        if _client is None:
+            _uri = uri
+            _client = MongoClient(uri, **_client_options(pool_monitor))
+            metrics.slow_query_log.client = _client
+            health.start(_client)
+    return _client
+
+
+def get_async_client():
+    """asgi_app.py 用的 AsyncMongoClient (pymongo 4.9+ 內建的 async API，取代 Motor)，和 get_client 同一個 URI。
+    AsyncMongoClient 綁定第一次使用它的 event loop，所以只能在 worker 的 event loop 裡呼叫"""
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            _async_client = pymongo.AsyncMongoClient(_uri, **_client_options(async_pool_monitor))
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    with _client_lock:
+        client, _async_client = _async_client, None
+    if client is not None:
+        await client.close()
+
+
+def async_collection(db_name, name, query_class="interactive"):
+    return get_async_client()[db_name].get_collection(
+        name, read_preference=QUERY_CLASSES[query_class]["read_preference"])
+
+
+def database(db_name, query_class="interactive"):
+    """依查詢類別設定 read preference 的 database (一次查好幾個 collection 時用)"""
+    return get_client().get_database(db_name, read_preference=QUERY_CLASSES[query_class]["read_preference"])
+
+
+def collection(db_name, name, query_class="interactive"):
+    """依查詢類別設定 read preference 的 collection"""
+    return database(db_name, query_class)[name]
+
+
+def max_time_ms(query_class):
+    return QUERY_CLASSES[query_class]["max_time_ms"]
+
+
+def timeout(query_class):
+    """with data_access.timeout("analytics"): 區塊內所有 Mongo 操作共用這個時間上限"""
+    ms = max_time_ms(query_class)
+    return pymongo.timeout(ms / 1000.0 if ms else None)
+
+
+def stats():
+    out = {"breaker": breaker.stats(), "health": health.stats(), "pools": pool_monitor.stats()}
+    if _async_client is not None:
+        out["async_pools"] = async_pool_monitor.stats()
+    return out
@@ -0,0 +1,154 @@
+import datetime
+import threading
+import time
+
+from pymongo import ASCENDING, UpdateOne
+
+# 裝置登錄表：每個 DB 的 devices collection 一台裝置 (safe_Mac) 一筆，取代對 posture_data 的 distinct 掃描。
+#   {_id: safe_Mac, firstSeen, lastSeen, Posture_state, safe_battery, band_battery, Step, updatedAt}
+# 最新值 (LATEST_FIELDS) 是最後一筆有帶這個欄位的讀數；比 lastSeen 舊的讀數 (晚到) 不會蓋掉較新的值。
+# 寫入來源：/api/ingest 每次 flush 時更新；樹莓派直接寫進 posture_data 的讀數由定期 sweep 補上
+# (從上次掃到的時間往後依 timestamp 讀，重疊一段時間收晚到的資料，重複套用結果相同)。
+# online 不存，讀取時由 lastSeen 判斷。
+
+LATEST_FIELDS = ("Posture_state", "safe_battery", "band_battery", "Step")
+ONLINE_SEC = 60                 # lastSeen 在這麼多秒內算在線上
+SWEEP_OVERLAP_SEC = 120         # sweep 從上次掃到的時間往前重疊多久
+SWEEP_BATCH = 10000
+CACHE_TTL_SEC = 10
+
+_UTC = datetime.timezone.utc
+
+
+def _naive(ts):
+    return ts.astimezone(_UTC).replace(tzinfo=None) if ts.tzinfo is not None else ts
+
+
+def summarize(readings):
+    """讀數 (任意順序) → {mac: {"firstSeen", "lastSeen", 各欄位最新的值}}"""
+    summary = {}
+    for doc in sorted(readings, key=lambda d: _naive(d["timestamp"])):
+        mac = doc.get("safe_Mac")
+        if not mac:
+            continue
+        ts = _naive(doc["timestamp"])
+        entry = summary.setdefault(mac, {"firstSeen": ts})
+        entry["lastSeen"] = ts
+        for field in LATEST_FIELDS:
+            if doc.get(field) is not None:
+                entry[field] = doc[field]
+    return summary
+
+
+def update_ops(summary):
+    """每台裝置兩個依序執行的 update：先擴大 firstSeen / lastSeen，
+    lastSeen 沒有比這批更新的話 (這批是目前最新的) 才寫入最新值"""
+    now = datetime.datetime.now(_UTC)
+    ops = []
+    for mac, entry in summary.items():
+        ops.append(UpdateOne({"_id": mac}, {"$min": {"firstSeen": entry["firstSeen"]},
+                                            "$max": {"lastSeen": entry["lastSeen"]},
+                                            "$set": {"updatedAt": now}}, upsert=True))
+        latest = {f: entry[f] for f in LATEST_FIELDS if f in entry}
+        if latest:
+            ops.append(UpdateOne({"_id": mac, "lastSeen": {"$lte": entry["lastSeen"]}}, {"$set": latest}))
+    return ops
+
+
+def record(mongo_db, readings):
+    """把一批讀數套用到登錄表，回傳有更新的裝置數"""
+    summary = summarize(readings)
+    if summary:
+        mongo_db["devices"].bulk_write(update_ops(summary), ordered=True)
+    return len(summary)
+
+
+def bootstrap(mongo_db):
+    """登錄表還沒建立時，用 (safe_Mac, timestamp) index 一次建好：每台裝置讀頭尾各一筆，
+    最新值各讀一筆。回傳最新的 lastSeen (sweep 從這裡接著掃)"""
+    coll = mongo_db["posture_data"]
+    latest_seen = None
+    for mac in coll.distinct("safe_Mac"):
+        if not mac:
+            continue
+        first = coll.find_one({"safe_Mac": mac}, {"timestamp": 1}, sort=[("timestamp", ASCENDING)])
+        last = coll.find_one({"safe_Mac": mac}, {"timestamp": 1}, sort=[("timestamp", -1)])
+        if first is None or last is None:
+            continue
+        entry = {"firstSeen": _naive(first["timestamp"]), "lastSeen": _naive(last["timestamp"])}
+        for field in LATEST_FIELDS:
+            doc = coll.find_one({"safe_Mac": mac, field: {"$ne": None}}, {field: 1}, sort=[("timestamp", -1)])
+            if doc is not None:
+                entry[field] = doc[field]
+        mongo_db["devices"].bulk_write(update_ops({mac: entry}), ordered=True)
+        latest_seen = entry["lastSeen"] if latest_seen is None else max(latest_seen, entry["lastSeen"])
+    return latest_seen
+
+
+def sweep(mongo_db, since, until):
+    """timestamp 在 (since - 重疊, until] 的讀數套用到登錄表 (需要 timestamp 開頭的 index)，
+    回傳 (讀數筆數, 下次從哪裡開始)。時間超過 until 的讀數 (裝置時鐘快了) 留到下次，才不會把進度推到未來"""
+    time_query = {"$gt": since - datetime.timedelta(seconds=SWEEP_OVERLAP_SEC), "$lte": until}
+    cursor = (mongo_db["posture_data"]
+              .find({"timestamp": time_query}, dict.fromkeys(("safe_Mac", "timestamp") + LATEST_FIELDS, 1))
+              .sort("timestamp", ASCENDING)
+              .batch_size(SWEEP_BATCH))
+    rows, batch, last = 0, [], since
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= SWEEP_BATCH:
+            record(mongo_db, batch)
+            rows += len(batch)
+            last = max(last, _naive(batch[-1]["timestamp"]))
+            batch = []
+    if batch:
+        record(mongo_db, batch)
+        rows += len(batch)
+        last = max(last, _naive(batch[-1]["timestamp"]))
+    return rows, last
+
+
+def device_json(doc, now=None):
+    now = now or datetime.datetime.now(_UTC).replace(tzinfo=None)
+    out = {"safe_Mac": doc["_id"], "firstSeen": doc.get("firstSeen"), "lastSeen": doc.get("lastSeen"),
+           "online": doc.get("lastSeen") is not None and (now - doc["lastSeen"]).total_seconds() <= ONLINE_SEC}
+    out.update((f, doc.get(f)) for f in LATEST_FIELDS)
+    return out
+
+
+class DeviceCache:
+    """每個 DB 的 devices 文件在記憶體裡留 ttl 秒；這個 worker 寫入登錄表時直接失效，
+    其他 worker 的寫入最多晚 ttl 秒看到"""
+    def __init__(self, load, ttl=CACHE_TTL_SEC):
+        self.load = load                # db_name -> devices 文件 list
+        self.ttl = ttl
+        self.entries = {}               # db_name -> (到期的 monotonic 時間, docs)
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def peek(self, db_name):
+        """快取還有效就回傳，否則 None (不查 Mongo)"""
+        with self.lock:
+            entry = self.entries.get(db_name)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def get(self, db_name):
+        docs = self.peek(db_name)
+        if docs is not None:
+            return docs
+        docs = self.load(db_name)
+        with self.lock:
+            self.misses += 1
+            self.entries[db_name] = (time.monotonic() + self.ttl, docs)
+        return docs
+
+    def invalidate(self, db_name):
+        with self.lock:
+            self.entries.pop(db_name, None)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "dbs": len(self.entries)}
@@ -0,0 +1,59 @@
+import numpy as np  # pip install numpy
+
+# 時間序列降採樣：把幾十萬個點壓成圖表需要的幾千個點
+# lttb   : Largest-Triangle-Three-Buckets，保留形狀 (尖峰不會被平均掉)
+# minmax : 每個時間區間的 min / max / avg / count
+
+
+def lttb(t, v, max_points):
+    """Largest-Triangle-Three-Buckets。t, v 為已依時間排序的 float 陣列，回傳選到的 (t, v)"""
+    n = len(t)
+    if max_points >= n or max_points < 3:
+        return t, v
+
+    # 頭尾固定保留，中間切成 max_points - 2 個等筆數的 bucket
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    # 每個 bucket 的平均點，當作「下一個 bucket」的代表點
+    sums_t = np.add.reduceat(t[1:n - 1], edges[:-1] - 1)
+    sums_v = np.add.reduceat(v[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_t = np.append(sums_t / counts, t[-1])
+    avg_v = np.append(sums_v / counts, v[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bt, bv = t[lo:hi], v[lo:hi]
+        # 三角形面積 (省略 1/2)：前一個選到的點 a、這個 bucket 的候選點、下一個 bucket 的平均點
+        area = np.abs((t[a] - avg_t[i + 1]) * (bv - v[a]) - (t[a] - bt) * (avg_v[i + 1] - v[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return t[selected], v[selected]
+
+
+def minmax_buckets(t, v, start, end, max_points):
+    """把 [start, end) 切成 max_points 個等寬時間區間，回傳每個有資料區間的 (bucket 起點, min, max, avg, count)"""
+    width = max((end - start) / max_points, 1.0)
+    idx = np.floor((t - start) / width).astype(np.int64)
+    keep = (idx >= 0) & (idx < max_points)
+    idx, v = idx[keep], v[keep]
+    if not len(idx):
+        empty = np.array([], dtype=np.float64)
+        return empty, empty, empty, empty, np.array([], dtype=np.int64)
+
+    # 資料已經按時間排序，所以同一個 bucket 是連續的一段
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(idx)) + 1))
+    counts = np.diff(np.append(starts, len(idx)))
+    bucket_t = start + idx[starts] * width
+    return (bucket_t,
+            np.minimum.reduceat(v, starts),
+            np.maximum.reduceat(v, starts),
+            np.add.reduceat(v, starts) / counts,
+            counts)
+
+
+def to_float_array(values):
+    """Mongo 讀出的數值 (可能是 None) → float 陣列，None 變 NaN"""
+    return np.array([np.nan if x is None else x for x in values], dtype=np.float64)
@@ -0,0 +1,26 @@
+import data_access
+from segments import compress_segments
+
+# 背景 full ETL 的 worker process (spawn 啟動)：只 import 這個輕量模組，不會載入 web_app (排程、快取、Flask)。
+# 任務單位是一台裝置一天的 raw：讀取與壓縮在 worker 裡平行做，段落、rollup 與 watermark 由主 process
+# 依時間順序寫入，所以跨天接回同一段、checkpoint 的行為和 incremental_etl 相同。
+
+def init_worker(uri):
+    """ProcessPoolExecutor 的 initializer：每個 worker 一個連線池 (之後 data_access.collection 都用它)"""
+    data_access.get_client(uri)
+
+
+def compress_day(db_name, mac, start, end, after=None):
+    """[start, end) 之間 (且晚於 after，也就是 watermark) 的 raw 壓成段落，
+    回傳 (筆數, 段落, 最後一筆 timestamp)；段落還沒和上一天的 open 段落接起來"""
+    time_query = {"$gte": start, "$lt": end}
+    if after is not None:
+        time_query["$gt"] = after
+    docs = list(data_access.collection(db_name, "posture_data", "etl")
+                .find({"safe_Mac": mac, "timestamp": time_query},
+                      {"_id": 0, "timestamp": 1, "Posture_state": 1, "safe_Mac": 1})
+                .sort("timestamp", 1)
+                .batch_size(10000))
+    if not docs:
+        return 0, [], None
+    return len(docs), compress_segments(docs), docs[-1]["timestamp"]
@@ -0,0 +1,24 @@
+# 多 worker 部署：gunicorn -c gunicorn.conf.py web_app:app
+# async 讀取 API (asgi_app.py)：WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py asgi_app:app
+# 每個 worker 都能服務 request；排程的 ETL、警報與 /api/ingest 的線上段落只在租約選出的 leader 執行
+# (見 web_app.py 排程區塊、LiveSegmenter)。
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5050")
+workers = int(os.environ.get("WEB_WORKERS", "4"))
+# /api/stream (SSE) 是長連線，用 thread worker 才不會一條連線卡住整個 worker
+worker_class = os.environ.get("WORKER_CLASS", "gthread")
+threads = int(os.environ.get("WEB_THREADS", "16"))
+timeout = 120
+graceful_timeout = 30
+# 不要 preload：連線池和背景執行緒 (租約、LiveFeed、ingest writer) 必須在各 worker fork 之後才建立
+preload_app = False
+
+raw_env = ["ETL_SCHEDULER=" + os.environ.get("ETL_SCHEDULER", "leader")]
+
+def worker_exit(server, worker):
+    # worker 停下前把 /api/ingest 已經回 202 的讀數寫完，graceful_timeout 到了 master 就會 SIGKILL
+    import sys
+    web_app = sys.modules.get("web_app")
+    if web_app is not None:
+        web_app.ingest_writer.shutdown(timeout=graceful_timeout)
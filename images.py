@@ -0,0 +1,142 @@
+import io
+import threading
+from collections import OrderedDict
+
+import gridfs
+from pymongo import ASCENDING, DESCENDING
+
+try:
+    from PIL import Image, ImageOps  # pip install Pillow
+except ImportError:                  # 沒有 Pillow 時縮圖請求直接回原圖
+    Image = ImageOps = None
+
+# 飲食照片存在各 DB 的 GridFS bucket "food_images"：
+#   原圖 metadata = {kind: "original", device, date, contentType}，同一個 device/date 重新上傳會取代舊的 (連同縮圖)
+#   縮圖 metadata = {kind: "thumb", source: 原圖 _id, size}，第一次被要求時產生並存回 GridFS，所有 worker 共用
+# 原圖的 _id 不會變，所以 (原圖 _id, 尺寸) 可以當 ETag，也是記憶體 LRU 的 key。
+
+BUCKET = "food_images"
+THUMB_SIZES = (160, 320, 800)        # 縮圖長邊 (px)；列表用 160，高解析度螢幕用 320
+THUMB_QUALITY = 80
+THUMB_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+_indexed = set()
+_indexed_lock = threading.Lock()
+
+
+def get_bucket(mongo_db):
+    with _indexed_lock:
+        first = mongo_db.name not in _indexed
+        _indexed.add(mongo_db.name)
+    if first:
+        files = mongo_db[f"{BUCKET}.files"]
+        files.create_index([("metadata.device", ASCENDING), ("metadata.date", ASCENDING),
+                            ("uploadDate", DESCENDING)])
+        files.create_index([("metadata.source", ASCENDING), ("metadata.size", ASCENDING)], sparse=True)
+    return gridfs.GridFSBucket(mongo_db, bucket_name=BUCKET)
+
+
+def find_original(mongo_db, device, date):
+    """device/date 最新的原圖 (GridFS files 文件)；沒有回傳 None"""
+    get_bucket(mongo_db)
+    return mongo_db[f"{BUCKET}.files"].find_one(
+        {"metadata.kind": "original", "metadata.device": device, "metadata.date": date},
+        sort=[("uploadDate", DESCENDING)])
+
+
+def open_original(mongo_db, file_id):
+    """可 seek 的 GridOut，給 Range 請求用"""
+    return get_bucket(mongo_db).open_download_stream(file_id)
+
+
+def save_original(mongo_db, device, date, data, content_type):
+    """存原圖並刪掉同一個 device/date 之前的原圖和縮圖，回傳新的 file _id"""
+    bucket = get_bucket(mongo_db)
+    file_id = bucket.upload_from_stream(f"{device}/{date}", data, metadata={
+        "kind": "original", "device": device, "date": date, "contentType": content_type})
+    files = mongo_db[f"{BUCKET}.files"]
+    for old in files.find({"metadata.kind": "original", "metadata.device": device,
+                           "metadata.date": date, "_id": {"$ne": file_id}}, {"_id": 1}):
+        for thumb in files.find({"metadata.source": old["_id"]}, {"_id": 1}):
+            bucket.delete(thumb["_id"])
+        bucket.delete(old["_id"])
+    return file_id
+
+
+# ---- 縮圖 ----
+def thumb_size(requested):
+    """要求的寬度 → 不小於它的最小縮圖尺寸 (太大就用最大的)，避免每個尺寸都存一份"""
+    return next((s for s in THUMB_SIZES if s >= requested), THUMB_SIZES[-1])
+
+
+def make_thumbnail(data, size):
+    """原圖 bytes → 長邊 size px 的 JPEG (依 EXIF 轉正)；沒有 Pillow、不是圖片或解不開回傳 None"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((size, size))
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            out = io.BytesIO()
+            img.save(out, "JPEG", quality=THUMB_QUALITY, optimize=True, progressive=True)
+            return out.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f"[IMAGE] 無法產生縮圖: {e}")
+        return None
+
+
+def get_thumbnail(mongo_db, original, size):
+    """GridFS 裡已經有就直接讀，沒有就從原圖產生並存回去；回傳 JPEG bytes 或 None"""
+    bucket = get_bucket(mongo_db)
+    files = mongo_db[f"{BUCKET}.files"]
+    thumb = files.find_one({"metadata.source": original["_id"], "metadata.size": size},
+                           sort=[("uploadDate", ASCENDING)])
+    if thumb is not None:
+        return bucket.open_download_stream(thumb["_id"]).read()
+    body = make_thumbnail(bucket.open_download_stream(original["_id"]).read(), size)
+    if body is not None:
+        # 兩個 worker 同時產生會存成兩份，讀的時候固定拿最早那份，不影響結果
+        bucket.upload_from_stream(f"{original['filename']}@{size}", body, metadata={
+            "kind": "thumb", "source": original["_id"], "size": size, "contentType": "image/jpeg"})
+    return body
+
+
+class ThumbnailCache:
+    """熱門縮圖的 LRU (總大小上限)。key 含原圖 _id，重新上傳就是新的 key，不需要失效"""
+    def __init__(self, max_bytes=THUMB_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()   # (db, 原圖 _id, size) -> bytes
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self.entries[key] = body
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self.entries), "bytes": self.bytes}
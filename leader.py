@@ -0,0 +1,188 @@
+import datetime
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+# Mongo 上的租約鎖：locks collection 每個名稱一筆 {_id, owner, term, acquiredAt, renewedAt, expiresAt}。
+# 時間一律用 server 的 $$NOW，不受各台機器時鐘誤差影響；過期後任何 worker 都可以接手，
+# 每換一次 owner term 就 +1 (fencing token)：持有者把 term 帶進受保護的寫入當條件 (寫入端記住看過的最大 term)，
+# 租約過期、被別人以更大的 term 接手後，舊持有者的寫入會被拒絕 (StaleTermError)。
+
+LEASE_SEC = 30                  # 租約長度；持有者每 LEASE_SEC / 3 續約一次
+LOCK_GC_SEC = 7 * 86400         # 過期超過這麼久的鎖文件由 TTL index 清掉 (只影響管理頁面的歷史)
+JOB_RUNS_KEEP_SEC = 30 * 86400  # job_runs 保留多久
+
+
+class StaleTermError(RuntimeError):
+    """寫入時發現已經有更新的 term 寫過：租約已經換人，這個工作要停下來"""
+
+
+def worker_id():
+    """host:pid:隨機碼，同一台機器上的多個 worker 也不會重複"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def ensure_indexes(control_db):
+    control_db["locks"].create_index("expiresAt", expireAfterSeconds=LOCK_GC_SEC)
+    control_db["job_runs"].create_index([("job", 1), ("startedAt", -1)])
+    control_db["job_runs"].create_index("startedAt", expireAfterSeconds=JOB_RUNS_KEEP_SEC)
+
+
+class MongoLease:
+    def __init__(self, coll, name, owner, lease_sec=LEASE_SEC):
+        self.coll, self.name, self.owner, self.lease_sec = coll, name, owner, lease_sec
+        self.valid_until = 0.0      # 本機 monotonic 時間；以送出請求前的時間起算，保守估計
+        self.term = None
+        self.lock = threading.Lock()
+        self.local = threading.Lock()    # 同一個 process 內也只能有一個 hold()
+
+    @property
+    def held(self):
+        return time.monotonic() < self.valid_until
+
+    def try_acquire(self):
+        """取得或續約；別人持有且還沒過期時回傳 False"""
+        t0 = time.monotonic()
+        mine = {"$eq": ["$owner", self.owner]}
+        try:
+            doc = self.coll.find_one_and_update(
+                {"_id": self.name,
+                 "$or": [{"owner": self.owner}, {"$expr": {"$lte": ["$expiresAt", "$$NOW"]}}]},
+                [{"$set": {
+                    "owner": self.owner,
+                    "renewedAt": "$$NOW",
+                    "expiresAt": {"$add": ["$$NOW", int(self.lease_sec * 1000)]},
+                    "acquiredAt": {"$cond": [mine, "$acquiredAt", "$$NOW"]},
+                    "term": {"$cond": [mine, "$term", {"$add": [{"$ifNull": ["$term", 0]}, 1]}]},
+                }}],
+                upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            # 文件存在但條件不符 (別人持有)，upsert 撞到 _id
+            with self.lock:
+                self.valid_until = 0.0
+            return False
+        with self.lock:
+            self.valid_until = t0 + self.lease_sec
+            self.term = doc.get("term")
+        return True
+
+    def release(self):
+        """主動放掉 (正常關機時)，其他 worker 下一次嘗試就能接手"""
+        with self.lock:
+            if not self.valid_until:
+                return
+            self.valid_until = 0.0
+        try:
+            self.coll.update_one({"_id": self.name, "owner": self.owner},
+                                 [{"$set": {"expiresAt": "$$NOW"}}])
+        except PyMongoError as e:
+            print(f"[LEASE] 釋放 {self.name} 失敗: {e}")
+
+    @contextmanager
+    def hold(self):
+        """with lease.hold() as ok：拿到就在背景續約到區塊結束；拿不到 ok 為 False"""
+        if not self.local.acquire(blocking=False):
+            yield False
+            return
+        try:
+            acquired = self.try_acquire()
+        except PyMongoError:
+            self.local.release()
+            raise
+        if not acquired:
+            self.local.release()
+            yield False
+            return
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.lease_sec / 3):
+                try:
+                    self.try_acquire()
+                except PyMongoError as e:
+                    print(f"[LEASE] {self.name} 續約失敗: {e}")
+
+        thread = threading.Thread(target=renew, daemon=True, name=f"lease-{self.name}")
+        thread.start()
+        try:
+            yield True
+        finally:
+            stop.set()
+            self.release()
+            self.local.release()
+
+    def status(self):
+        return self.coll.find_one({"_id": self.name})
+
+
+class LeaderElector:
+    """背景每 LEASE_SEC / 3 秒嘗試取得或續約；leader 掛掉後最多一個租約期間 (+一次嘗試間隔) 就換人"""
+    def __init__(self, lease):
+        self.lease = lease
+        self.thread = None
+        self.was_leader = False
+        self.stopped = threading.Event()
+
+    @property
+    def is_leader(self):
+        return self.lease.held
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, daemon=True, name="leader-elector")
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.lease.release()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.lease.try_acquire()
+            except PyMongoError as e:
+                # 連不到 Mongo：本機的租約時間到了就自動不是 leader
+                print(f"[LEADER] 續約失敗: {e}")
+            if self.is_leader != self.was_leader:
+                self.was_leader = self.is_leader
+                print(f"[LEADER] {self.lease.owner} {'成為 leader (term ' + str(self.lease.term) + ')' if self.is_leader else '不再是 leader'}")
+            self.stopped.wait(self.lease.lease_sec / 3)
+
+
+def run_job(control_db, name, owner, fn, lock=None):
+    """執行一次排程工作並記錄到 job_runs，回傳 (status, result)；
+    有 lock 時拿不到就記錄並回傳 skipped (別的 worker 正在跑)"""
+    runs = control_db["job_runs"]
+    started = datetime.datetime.now(datetime.timezone.utc)
+    run = {"job": name, "owner": owner, "startedAt": started, "status": "running"}
+    with (lock.hold() if lock is not None else _always()) as ok:
+        if not ok:
+            run.update(status="skipped", finishedAt=started)
+            runs.insert_one(run)
+            return "skipped", None
+        if lock is not None:
+            run["term"] = lock.term
+        run_id = runs.insert_one(run).inserted_id
+        t0 = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            runs.update_one({"_id": run_id}, {"$set": {
+                "status": "failed", "error": str(e), "duration": time.perf_counter() - t0,
+                "finishedAt": datetime.datetime.now(datetime.timezone.utc)}})
+            raise
+        runs.update_one({"_id": run_id}, {"$set": {
+            "status": "ok", "result": result if isinstance(result, (str, int, float, list, dict)) else str(result),
+            "duration": time.perf_counter() - t0, "finishedAt": datetime.datetime.now(datetime.timezone.utc)}})
+        return "ok", result
+
+
+@contextmanager
+def _always():
+    yield True
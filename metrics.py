@@ -0,0 +1,315 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+from bson import json_util
+from pymongo import monitoring
+
+# 內建監控：histogram / counter / gauge 以 Prometheus text format 輸出 (/metrics)
+# 另外有 pymongo CommandListener 記錄每個 collection 的指令時間，超過門檻的查詢背景跑 explain()
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SLOW_QUERY_MS = 500              # 超過這個時間的查詢記錄 explain
+SLOW_QUERY_KEEP = 100            # 記憶體內保留最近幾筆
+SLOW_QUERY_DEDUPE_SEC = 60       # 同一種查詢多久內只 explain 一次
+EXPLAIN_COMMANDS = ("find", "aggregate", "count", "distinct")
+
+REGISTRY = []
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _num(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.series = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            lines += self._samples()
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + value
+
+    def _samples(self):
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in sorted(self.series.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.series[self._key(labels)] = value
+
+
+class GaugeFunc(Metric):
+    """render 時才呼叫 fn() 取值；fn 回傳 {label 值 tuple: 數值}"""
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames, fn):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def _samples(self):
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"[METRICS] {self.name} 取值失敗: {e}")
+            return []
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in sorted(values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def _samples(self):
+        lines = []
+        for key, (counts, total, count) in sorted(self.series.items()):
+            acc = 0
+            for bound, c in zip(self.buckets, counts):
+                acc += c
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _num(bound))])} {acc}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render():
+    """所有 metric 的 Prometheus text format"""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# ---- 共用的 metric ----
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency",
+                            ("route", "method", "status", "db"))
+MONGO_COMMAND_SECONDS = Histogram("mongo_command_duration_seconds", "MongoDB command latency",
+                                  ("db", "collection", "command"))
+MONGO_COMMAND_FAILURES = Counter("mongo_command_failures_total", "MongoDB commands that failed",
+                                 ("db", "collection", "command"))
+MONGO_DOCS_RETURNED = Counter("mongo_documents_returned_total", "Documents returned by MongoDB commands",
+                              ("db", "collection", "command"))
+SPAN_SECONDS = Histogram("span_duration_seconds", "Time spent in instrumented code sections", ("span",))
+ETL_RUN_SECONDS = Histogram("etl_run_duration_seconds", "Incremental ETL run duration per DB", ("db",),
+                            buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0))
+ETL_ROWS = Counter("etl_rows_total", "Raw posture rows compressed by the ETL", ("db",))
+ETL_SEGMENTS = Counter("etl_segments_total", "Posture segments written by the ETL", ("db",))
+ETL_LAST_SUCCESS = Gauge("etl_last_success_timestamp_seconds", "Unix time of the last successful ETL run",
+                         ("db",))
+SLOW_QUERIES = Counter("mongo_slow_queries_total", "MongoDB commands slower than the slow-query threshold",
+                       ("db", "collection", "command"))
+
+
+@contextmanager
+def span(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - t0, span=name)
+
+
+def timed(name):
+    """decorator 版的 span"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---- MongoDB 指令計時 ----
+def _collection_of(command_name, command):
+    if command_name == "getMore":
+        return command.get("collection", "")
+    value = command.get(command_name)
+    return value if isinstance(value, str) else ""
+
+
+def _docs_returned(reply):
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if isinstance(reply.get("values"), list):     # distinct
+        return len(reply["values"])
+    return 0
+
+
+class SlowQueryLog:
+    """超過 SLOW_QUERY_MS 的查詢放進佇列，由背景執行緒跑 explain("queryPlanner")，
+    不在 CommandListener 裡直接查 (listener 在 pymongo 的呼叫路徑上，不能阻塞也不能遞迴觸發)"""
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, keep=SLOW_QUERY_KEEP):
+        self.threshold_ms = threshold_ms
+        self.entries = deque(maxlen=keep)
+        self.client = None
+        self.pending = deque(maxlen=keep)
+        self.seen = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def record(self, db, collection, command_name, command, duration_ms):
+        # 查詢的「形狀」：filter 的欄位 / pipeline 的階段，值不同也算同一種
+        shape = (db, collection, command_name, tuple(sorted(command.get("filter") or {})),
+                 tuple(next(iter(stage), "") for stage in command.get("pipeline") or []))
+        now = time.time()
+        with self.lock:
+            if now - self.seen.get(shape, 0) < SLOW_QUERY_DEDUPE_SEC:
+                return
+            if len(self.seen) > 1000:
+                self.seen = {k: t for k, t in self.seen.items() if now - t < SLOW_QUERY_DEDUPE_SEC}
+            self.seen[shape] = now
+            self.pending.append((now, db, collection, command_name, command, duration_ms))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True, name="slow-query-explain")
+                self.thread.start()
+        self.wakeup.set()
+
+    def _run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            while True:
+                with self.lock:
+                    if not self.pending:
+                        break
+                    at, db, collection, command_name, command, duration_ms = self.pending.popleft()
+                entry = {"at": at, "db": db, "collection": collection, "command": command_name,
+                         "duration_ms": round(duration_ms, 1), "query": _plain_json(command), "plan": None}
+                try:
+                    explain = self.client[db].command("explain", command, verbosity="queryPlanner")
+                    entry["plan"] = _plain_json(explain.get("queryPlanner", explain))
+                except Exception as e:
+                    entry["plan"] = {"error": str(e)}
+                print(f"[SLOW] {db}.{collection} {command_name} {entry['duration_ms']}ms "
+                      f"plan={_winning_stage(entry['plan'])}")
+                with self.lock:
+                    self.entries.appendleft(entry)
+
+    def recent(self, limit=None):
+        with self.lock:
+            entries = list(self.entries)
+        return entries[:limit] if limit else entries
+
+
+def _plain_json(doc):
+    """ObjectId / datetime 等 BSON 型別轉成一般 JSON 可以輸出的值"""
+    return json.loads(json_util.dumps(doc))
+
+
+def _winning_stage(plan):
+    """explain 結果的 winningPlan 階段名稱串 (例如 FETCH>IXSCAN)"""
+    stage = (plan or {}).get("winningPlan") or {}
+    stage = stage.get("queryPlan", stage)          # 新版 (SBE) 多包一層
+    names = []
+    while stage:
+        names.append(stage.get("stage", "?"))
+        stage = stage.get("inputStage") or (stage.get("inputStages") or [None])[0]
+    return ">".join(names) or "?"
+
+
+class CommandTimer(monitoring.CommandListener):
+    """每個 MongoDB 指令的時間與回傳筆數；慢查詢交給 SlowQueryLog"""
+    IGNORED = ("explain", "hello", "isMaster", "ismaster", "ping", "endSessions", "saslStart",
+               "saslContinue", "buildInfo", "killCursors")
+    STRIPPED = ("lsid", "$clusterTime", "$db", "$readPreference", "txnNumber", "signature")
+
+    def __init__(self, slow_log):
+        self.slow_log = slow_log
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in self.IGNORED:
+            return
+        command = None
+        if event.command_name in EXPLAIN_COMMANDS:
+            command = {k: v for k, v in event.command.items() if k not in self.STRIPPED}
+        with self.lock:
+            self.inflight[(event.connection_id, event.request_id)] = (
+                event.database_name, _collection_of(event.command_name, event.command), command)
+
+    def _finish(self, event):
+        with self.lock:
+            return self.inflight.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event):
+        info = self._finish(event)
+        if info is None:
+            return
+        db, collection, command = info
+        labels = {"db": db, "collection": collection, "command": event.command_name}
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, **labels)
+        returned = _docs_returned(event.reply)
+        if returned:
+            MONGO_DOCS_RETURNED.inc(returned, **labels)
+        duration_ms = event.duration_micros / 1000.0
+        if command is not None and duration_ms >= self.slow_log.threshold_ms:
+            SLOW_QUERIES.inc(**labels)
+            self.slow_log.record(db, collection, event.command_name, command, duration_ms)
+
+    def failed(self, event):
+        info = self._finish(event)
+        if info is None:
+            return
+        db, collection, _ = info
+        labels = {"db": db, "collection": collection, "command": event.command_name}
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, **labels)
+        MONGO_COMMAND_FAILURES.inc(**labels)
+
+
+slow_query_log = SlowQueryLog()
+command_timer = CommandTimer(slow_query_log)
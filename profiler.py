@@ -0,0 +1,184 @@
+import datetime
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# 取樣式效能剖析 (admin 用)：背景執行緒每隔 interval 用 sys._current_frames() 讀各執行緒的 Python call stack，
+# 累計成 collapsed stack 格式 (「執行緒;檔案:函式;...;檔案:函式 次數」一行一個 stack)，
+# 可以直接給 flamegraph.pl、speedscope 或 inferno 畫火焰圖。不用改被剖析的程式，也不需要重新部署。
+# 只看得到這個 process 的執行緒 (gunicorn 多 worker 時是收到這個 request 的 worker)；
+# 卡在 C 函式 (time.sleep、socket 讀取) 裡的執行緒顯示為呼叫它的 Python 函式。
+# 剖析結果存在 PROFILE_DIR：每份一個 .collapsed 加一個 .json 說明，超過 keep 份刪最舊的。
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+PROFILE_KEEP = 50
+SAMPLE_INTERVAL_SEC = 0.01         # 整個 process 取樣：每秒 100 次
+MAX_STACK_DEPTH = 128
+
+# 閒置的執行緒 (等 queue、Condition、select) 停在這些函式；預設不計入，火焰圖才看得出在忙什麼
+IDLE_FRAMES = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"),
+               ("selectors.py", "select"), ("socketserver.py", "serve_forever"), ("thread.py", "_worker")}
+
+_ID = re.compile(r"^[0-9A-Za-z_-]+$")
+_labels = {}                       # code object -> "檔案:函式"
+
+
+def _label(code):
+    label = _labels.get(code)
+    if label is None:
+        # ';' 和空白是 collapsed 格式的分隔字元
+        label = _labels[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(";", ":") \
+            .replace(" ", "_")
+    return label
+
+
+def _stack(frame):
+    """leaf frame → 由外到內的 label list"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+class Sampler:
+    """每 interval 秒取一次各執行緒的 stack；threads(ident, name) 回傳 False 的執行緒不取樣"""
+    def __init__(self, interval=SAMPLE_INTERVAL_SEC, threads=None, idle=False):
+        self.interval = interval
+        self.threads = threads
+        self.idle = idle
+        self.counts = Counter()
+        self.samples = 0
+        self.started = self.seconds = None
+        self._t0 = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        me = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            name = names.get(ident, f"thread-{ident}")
+            if self.threads is not None and not self.threads(ident, name):
+                continue
+            if not self.idle and _idle(frame):
+                continue
+            self.counts[";".join([name.replace(";", ":").replace(" ", "_")] + _stack(frame))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.seconds = time.perf_counter() - self._t0
+        return self
+
+    def run_for(self, seconds):
+        """在目前的執行緒取樣 seconds 秒，stop() 可以提早結束"""
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self._t0 = time.perf_counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not self._stop.wait(self.interval):
+            self.sample()
+        self.seconds = time.perf_counter() - self._t0
+        return self
+
+    def collapsed(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self.counts.most_common())
+
+    def summary(self):
+        started = self.started.isoformat(timespec="milliseconds") if self.started else None
+        return {"started": started, "seconds": round(self.seconds or 0.0, 3), "samples": self.samples,
+                "stacks": len(self.counts), "interval_ms": self.interval * 1000}
+
+
+class ProfileStore:
+    """磁碟上的 ring buffer：id 依時間排序，save 後只留最新的 keep 份"""
+    def __init__(self, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.seq = 0
+
+    def _path(self, profile_id, ext):
+        return os.path.join(self.directory, f"{profile_id}.{ext}")
+
+    def _write(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def save(self, collapsed, meta):
+        """回傳 profile id；.collapsed 先寫、說明檔後寫，list 列出來的一定下載得到"""
+        with self.lock:
+            self.seq += 1
+            profile_id = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{os.getpid()}-{self.seq:04d}"
+        os.makedirs(self.directory, exist_ok=True)
+        meta = dict(meta, id=profile_id, bytes=len(collapsed.encode()))
+        self._write(self._path(profile_id, "collapsed"), collapsed.encode())
+        self._write(self._path(profile_id, "json"), json.dumps(meta, default=str, ensure_ascii=False).encode())
+        self.prune()
+        return profile_id
+
+    def ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((n[:-5] for n in names if n.endswith(".json")), reverse=True)
+
+    def prune(self):
+        for profile_id in self.ids()[self.keep:]:
+            for ext in ("json", "collapsed"):
+                try:
+                    os.remove(self._path(profile_id, ext))
+                except FileNotFoundError:
+                    pass   # 其他 worker 已經刪掉了
+
+    def list(self):
+        """新→舊的說明 list"""
+        out = []
+        for profile_id in self.ids():
+            try:
+                with open(self._path(profile_id, "json"), encoding="utf-8") as f:
+                    out.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+        return out
+
+    def path(self, profile_id):
+        """.collapsed 檔的路徑；id 不合法或已經被淘汰回傳 None"""
+        if not _ID.match(profile_id or ""):
+            return None
+        path = self._path(profile_id, "collapsed")
+        return path if os.path.exists(path) else None
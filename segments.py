@@ -0,0 +1,179 @@
+import datetime
+import re
+from itertools import islice
+
+import numpy as np  # pip install numpy
+from dateutil import parser as dtparser  # pip install python-dateutil
+
+# 姿態段落壓縮：把每秒一筆的 posture_data 壓成 (state, startTime, endTime) 段落
+# compress_segments_py 是原本逐筆處理的版本，保留當作對照組；
+# compress_segments 是欄位化 (NumPy) 的版本，輸出完全相同。
+
+MAX_GAP_MS = 5 * 60 * 1000     # 兩筆間隔超過這個值就切段 (預設不啟用，傳 max_gap_ms 才會切)
+BATCH_SIZE = 50000             # 每次從 cursor 讀幾筆轉成欄位
+
+_EPOCH_NAIVE = datetime.datetime(1970, 1, 1)
+_timestamp = datetime.datetime.timestamp
+_TZ_SUFFIX = re.compile(r"[+-]\d{2}(:?\d{2})?$")
+_DATE_TIME_SEP = re.compile(r"[Tt ]")
+
+
+def compress_segments_py(docs, max_gap_ms=None):
+    segments, segment = [], None
+    last_state = last_mac = None
+    last_ts_ms = None
+
+    for doc in docs:
+        state = str(doc.get("Posture_state", "unknown"))
+        mac_v = doc.get("safe_Mac")
+        ts = doc.get("timestamp")
+        ts_ms = (ts.timestamp() if isinstance(ts, datetime.datetime)
+                 else dtparser.isoparse(ts).timestamp()) * 1000.0
+
+        if (segment and last_state == state and last_mac == mac_v
+                and (max_gap_ms is None or ts_ms - last_ts_ms <= max_gap_ms)):
+            segment["endTime"] = ts_ms
+            segment["duration"] = (segment["endTime"] - segment["startTime"]) / 1000.0
+        else:
+            if segment:
+                # 確保有 duration
+                segment["duration"] = (segment["endTime"] - segment["startTime"]) / 1000.0
+                segments.append(segment)
+            segment = {"state": state, "startTime": ts_ms, "endTime": ts_ms, "safe_Mac": mac_v, "duration": 0.0}
+
+        last_state, last_mac, last_ts_ms = state, mac_v, ts_ms
+
+    if segment:
+        segment["duration"] = (segment["endTime"] - segment["startTime"]) / 1000.0
+        segments.append(segment)
+
+    return segments
+
+
+def _naive_to_seconds(us):
+    """naive 時間 (datetime64[us]) → 與 datetime.timestamp() 相同的秒數。
+    naive datetime 的 timestamp() 是當作本機時間，所以要加上本機時區偏移。"""
+    whole = us // 1_000_000
+    micro = us - whole * 1_000_000
+    if not len(us):
+        return whole.astype(np.float64)
+
+    def local_offset(sec):
+        naive = _EPOCH_NAIVE + datetime.timedelta(seconds=int(sec))
+        return int(naive.timestamp()) - int(sec)
+
+    lo, hi = local_offset(whole.min()), local_offset(whole.max())
+    if lo == hi:
+        offset = lo
+    else:
+        # 區間內有日光節約時間切換，逐筆算偏移
+        offset = np.fromiter((local_offset(s) for s in whole), dtype=np.int64, count=len(whole))
+    # 和 datetime.timestamp() 一樣：整數秒 + 微秒 / 1e6
+    return (whole + offset).astype(np.float64) + micro / 1e6
+
+
+def timestamps_to_ms(values):
+    """一批 timestamp (datetime / ISO 字串混合) → float64 毫秒陣列"""
+    n = len(values)
+    try:
+        # 最常見的情況：全部都是 datetime (pymongo 讀出來的)，timestamp() 是 C 實作，直接用
+        return np.fromiter(map(_timestamp, values), dtype=np.float64, count=n) * 1000.0
+    except TypeError:
+        pass   # 有字串，走下面混合處理
+
+    seconds = np.empty(n, dtype=np.float64)
+    str_idx, str_val = [], []
+    for i, ts in enumerate(values):
+        if isinstance(ts, datetime.datetime):
+            seconds[i] = ts.timestamp()
+        else:
+            str_idx.append(i)
+            str_val.append(ts)
+
+    if str_idx:
+        # 字串才是慢的地方 (dateutil 逐筆解析)，整批處理
+        seconds[str_idx] = _strings_to_seconds(str_val)
+
+    return seconds * 1000.0
+
+
+def _strings_to_seconds(values):
+    """ISO 字串整批交給 NumPy 解析；帶時區的或 NumPy 不認得的格式才逐筆用 dateutil。
+    NumPy 看到 +08:00 這類偏移只會警告並換成 UTC，不能交給它，所以日期與時間之間不論是 T 還是空白都要檢查"""
+    out = np.empty(len(values), dtype=np.float64)
+    naive_idx, naive_val, utc_idx, utc_val, slow_idx = [], [], [], [], []
+    for i, s in enumerate(values):
+        parts = _DATE_TIME_SEP.split(s, 1)
+        if s.endswith("Z") or s.endswith("z"):
+            utc_idx.append(i)
+            utc_val.append(s[:-1])
+        elif len(parts) == 2 and _TZ_SUFFIX.search(parts[1]):
+            slow_idx.append(i)
+        else:
+            naive_idx.append(i)
+            naive_val.append(s)
+
+    for idx, vals, is_utc in ((naive_idx, naive_val, False), (utc_idx, utc_val, True)):
+        if not idx:
+            continue
+        try:
+            us = np.array(vals, dtype="datetime64[us]").astype(np.int64)
+        except ValueError:
+            slow_idx.extend(idx)
+            continue
+        out[idx] = us / 1e6 if is_utc else _naive_to_seconds(us)
+
+    for i in slow_idx:
+        out[i] = dtparser.isoparse(values[i]).timestamp()
+    return out
+
+
+def _codes(values, mapping):
+    """把 state / safe_Mac 轉成整數代碼，方便用 NumPy 比較相鄰值"""
+    for v in dict.fromkeys(values):
+        if v not in mapping:
+            mapping[v] = len(mapping)
+    return np.fromiter(map(mapping.__getitem__, values), dtype=np.int64, count=len(values))
+
+
+def compress_segments(docs, max_gap_ms=None, batch_size=BATCH_SIZE):
+    """欄位化版本的 compress_segments：分批讀 cursor，把 timestamp / state / safe_Mac
+    轉成陣列後用 diff 找出段落邊界，輸出和 compress_segments_py 相同"""
+    it = iter(docs)
+    ts_parts, state_parts, mac_parts = [], [], []
+    state_map, mac_map = {}, {}
+
+    while True:
+        batch = list(islice(it, batch_size))
+        if not batch:
+            break
+        ts_parts.append(timestamps_to_ms([d.get("timestamp") for d in batch]))
+        # state 依 str() 編碼，和 compress_segments_py 一樣 (1、1.0、"1"、True 不會混成同一段)
+        state_parts.append(_codes([str(d.get("Posture_state", "unknown")) for d in batch], state_map))
+        mac_parts.append(_codes([d.get("safe_Mac") for d in batch], mac_map))
+
+    if not ts_parts:
+        return []
+
+    state_names = list(state_map)
+    ts_ms = np.concatenate(ts_parts)
+    states = np.concatenate(state_parts)
+    macs = np.concatenate(mac_parts)
+
+    # 狀態或裝置改變的位置就是新段落的開頭
+    change = (states[1:] != states[:-1]) | (macs[1:] != macs[:-1])
+    if max_gap_ms is not None:
+        change |= (ts_ms[1:] - ts_ms[:-1]) > max_gap_ms
+    starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+    ends = np.concatenate((starts[1:] - 1, [len(ts_ms) - 1]))
+
+    start_ms = ts_ms[starts]
+    end_ms = ts_ms[ends]
+    durations = (end_ms - start_ms) / 1000.0
+
+    mac_values = list(mac_map)
+    return [
+        {"state": state_names[s], "startTime": st, "endTime": et, "safe_Mac": mac_values[m], "duration": du}
+        for s, st, et, m, du in zip(states[starts].tolist(), start_ms.tolist(), end_ms.tolist(),
+                                    macs[starts].tolist(), durations.tolist())
+    ]
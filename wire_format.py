@@ -0,0 +1,110 @@
+import datetime
+import gzip
+import json
+
+try:
+    import msgpack  # pip install msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli  # pip install brotli
+except ImportError:
+    brotli = None
+
+# 大量資料的傳輸格式
+# columnar：每個欄位一個陣列；重複的字串 (safe_Mac、state) 用字典編碼，時間欄位用差值編碼
+# msgpack ：同樣的欄位化結構，用 MessagePack 二進位編碼
+
+COLUMNAR_MIME = "application/vnd.posture.columnar+json"
+MSGPACK_MIME = "application/x-msgpack"
+DELTA_FIELDS = ("timestamp", "startTime", "endTime")
+DICT_MAX_RATIO = 0.5            # 不重複值佔比低於這個才用字典編碼
+
+
+def _plain(v):
+    """datetime 轉毫秒 (naive 當作 UTC，pymongo 讀出來的就是；和 JSON 回應的時間一致)，其他原樣"""
+    if isinstance(v, datetime.datetime):
+        if v.tzinfo is None:
+            v = v.replace(tzinfo=datetime.timezone.utc)
+        return v.timestamp() * 1000
+    return v
+
+
+def _int_if_whole(v):
+    return int(v) if isinstance(v, float) and v.is_integer() else v
+
+
+def encode_column(name, values):
+    values = [_plain(v) for v in values]
+    numeric = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)
+
+    # 時間欄位：整數毫秒時存第一個值 + 相鄰差值
+    if name in DELTA_FIELDS and numeric and values \
+            and all(isinstance(v, int) or v.is_integer() for v in values):
+        ints = [int(v) for v in values]
+        return {"delta": [ints[0]] + [b - a for a, b in zip(ints, ints[1:])]}
+
+    # 低基數字串：字典 + 代碼
+    if values and all(v is None or isinstance(v, str) for v in values):
+        uniques = list(dict.fromkeys(values))
+        if len(uniques) <= max(1, len(values) * DICT_MAX_RATIO):
+            index = {v: i for i, v in enumerate(uniques)}
+            return {"dict": uniques, "codes": [index[v] for v in values]}
+
+    return {"values": [_int_if_whole(v) for v in values] if numeric else values}
+
+
+def to_columnar(rows):
+    """list of dict → {"n", "columns": {欄位: 編碼後的欄}}；缺少的欄位以 null 補上"""
+    keys = list(dict.fromkeys(k for row in rows for k in row))
+    return {"format": "columnar", "n": len(rows),
+            "columns": {k: encode_column(k, [row.get(k) for row in rows]) for k in keys}}
+
+
+def from_columnar(payload):
+    """to_columnar 的反向 (測試與 Python 客戶端用)"""
+    columns = {}
+    for k, col in payload["columns"].items():
+        if "delta" in col:
+            out, acc = [], 0
+            for d in col["delta"]:
+                acc += d
+                out.append(acc)
+            columns[k] = out
+        elif "dict" in col:
+            columns[k] = [col["dict"][c] for c in col["codes"]]
+        else:
+            columns[k] = col["values"]
+    return [{k: columns[k][i] for k in columns} for i in range(payload["n"])]
+
+
+def dumps_msgpack(payload):
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def negotiate(accept, requested=None):
+    """依 ?format= 或 Accept header 決定格式：json / columnar / msgpack"""
+    fmt = (requested or "").lower()
+    if fmt in ("json", "columnar", "msgpack"):
+        return "json" if fmt == "msgpack" and msgpack is None else fmt
+    accept = accept or ""
+    if MSGPACK_MIME in accept and msgpack is not None:
+        return "msgpack"
+    if COLUMNAR_MIME in accept:
+        return "columnar"
+    return "json"
+
+
+def compress(body, accept_encoding):
+    """依 Accept-Encoding 壓縮，回傳 (壓縮後內容, encoding)；不支援就回傳 (body, None)"""
+    accept_encoding = accept_encoding or ""
+    if brotli is not None and "br" in accept_encoding:
+        return brotli.compress(body, quality=4), "br"
+    if "gzip" in accept_encoding:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
+
+
+def dumps_json(payload):
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")